@@ -2,6 +2,7 @@ from rest_framework.test import APIClient
 from rest_framework.test import APITestCase
 from django.contrib.auth.models import User
 from rest_framework.authtoken.models import Token
+from django.core.cache import cache
 from base import mods
 
 
@@ -9,6 +10,7 @@ class AuthTestCase(APITestCase):
     def setUp(self):
         self.client = APIClient()
         mods.mock_query(self.client)
+        cache.clear()
         u = User(username="voter1")
         u.set_password("123")
         u.save()
@@ -47,6 +49,31 @@ class AuthTestCase(APITestCase):
         self.assertEqual(user["id"], 1)
         self.assertEqual(user["username"], "voter1")
 
+    def test_getuser_cache(self):
+        data = {"username": "voter1", "password": "123"}
+        response = self.client.post("/authentication/login/", data, format="json")
+        token = response.json()
+
+        response = self.client.post("/authentication/getuser/", token, format="json")
+        self.assertEqual(response.json()["is_staff"], False)
+        with self.assertNumQueries(0):
+            response = self.client.post(
+                "/authentication/getuser/", token, format="json"
+            )
+        self.assertEqual(response.json()["username"], "voter1")
+
+        # changes in the user
+        u = User.objects.get(username="voter1")
+        u.is_staff = True
+        u.save()
+        response = self.client.post("/authentication/getuser/", token, format="json")
+        self.assertEqual(response.json()["is_staff"], True)
+
+        # the token is deleted, as in the logout
+        Token.objects.filter(key=token["token"]).delete()
+        response = self.client.post("/authentication/getuser/", token, format="json")
+        self.assertEqual(response.status_code, 404)
+
     def test_getuser_invented_token(self):
         token = {"token": "invented"}
         response = self.client.post("/authentication/getuser/", token, format="json")
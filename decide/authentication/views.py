@@ -5,7 +5,7 @@ from rest_framework.status import (
     HTTP_400_BAD_REQUEST,
 )
 from django.contrib.auth import logout
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from rest_framework.authtoken.models import Token
 from rest_framework.views import APIView
 from rest_framework.authtoken.models import Token
@@ -15,13 +15,13 @@ from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import authenticate, login
 from django.db import IntegrityError
-from django.shortcuts import get_object_or_404
 from allauth.socialaccount.models import SocialAccount
 from rest_framework.authtoken.models import Token
 from .forms import LoginForm
 from django.views.generic import TemplateView
 
 from .serializers import UserSerializer
+from base import tokens
 
 
 class LoginView(TemplateView):
@@ -55,11 +55,20 @@ class LoginView(TemplateView):
         return render(request, "log_in.html", {"form": form, "mensaje": mensaje})
 
 
+def load_user(key):
+    tk = Token.objects.select_related("user").filter(key=key).first()
+    if tk is None:
+        return None
+    return dict(UserSerializer(tk.user, many=False).data)
+
+
 class GetUserView(APIView):
     def post(self, request):
         key = request.data.get("token", "")
-        tk = get_object_or_404(Token, key=key)
-        return Response(UserSerializer(tk.user, many=False).data)
+        user = tokens.get_user(key, load=load_user)
+        if user is None:
+            raise Http404
+        return Response(user)
 
     def get(self, request):
         form = LoginForm(None)
@@ -0,0 +1,79 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models
+
+from base.models import BigBigField, BigBinField
+
+
+class TextVote(models.Model):
+    a = BigBigField()
+    b = BigBigField()
+
+    class Meta:
+        app_label = "base"
+        managed = False
+        db_table = "benchmark_text_vote"
+
+
+class BinVote(models.Model):
+    a = BigBinField()
+    b = BigBinField()
+
+    class Meta:
+        app_label = "base"
+        managed = False
+        db_table = "benchmark_bin_vote"
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the storage size and load time of the votes stored as "
+        "decimal text (BigBigField) and as big-endian bytes (BigBinField). "
+        "Two temporary tables are created and dropped at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--votes", type=int, default=100000)
+        parser.add_argument("--bits", type=int, default=2048)
+
+    def measure(self, model, values):
+        with connection.schema_editor() as editor:
+            editor.create_model(model)
+        try:
+            t = time.perf_counter()
+            model.objects.bulk_create(
+                (model(a=a, b=b) for a, b in values), batch_size=1000
+            )
+            save = time.perf_counter() - t
+
+            t = time.perf_counter()
+            loaded = list(model.objects.values_list("a", "b"))
+            load = time.perf_counter() - t
+            assert loaded[0] == values[0]
+
+            table = model._meta.db_table
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT SUM(LENGTH(a) + LENGTH(b)) FROM {}".format(table)
+                )
+                size = cursor.fetchone()[0]
+        finally:
+            with connection.schema_editor() as editor:
+                editor.delete_model(model)
+
+        print(
+            " * {:12} save {:7.2f}s, load {:7.2f}s, {:8.1f} MB".format(
+                model.__name__, save, load, size / 2**20
+            )
+        )
+
+    def handle(self, *args, **options):
+        bits = options["bits"]
+        values = [
+            (random.getrandbits(bits), random.getrandbits(bits))
+            for i in range(options["votes"])
+        ]
+        self.measure(TextVote, values)
+        self.measure(BinVote, values)
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from base import mods
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the queries a vote does to other modules (voting, "
+        "authentication and census) with and without the connection pool. "
+        "Needs a running server that keeps the connections alive, like "
+        "gunicorn with the gthread worker; runserver and the gunicorn sync "
+        "worker close them after every response. The local queries are "
+        "resolved in this process, as a single node deployment does."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--votes", type=int, default=1000)
+        parser.add_argument("--voting", type=int, default=1)
+        parser.add_argument("--voter", type=int, default=1)
+        parser.add_argument("--token", default="NO-AUTH-VOTE")
+
+    def cast(self, voting, voter, token):
+        # the same queries that StoreView.post does for every vote
+        mods.get("voting", params={"id": voting})
+        mods.post("authentication", entry_point="/getuser/", json={"token": token})
+        mods.get("census/{}".format(voting), params={"voter_id": voter}, response=True)
+
+    def measure(self, pool, local, options):
+        with override_settings(MODS_POOL=pool, MODS_LOCAL_DISPATCH=local):
+            t = time.perf_counter()
+            for i in range(options["votes"]):
+                self.cast(options["voting"], options["voter"], options["token"])
+            return time.perf_counter() - t
+
+    def handle(self, *args, **options):
+        n = options["votes"]
+        t1 = self.measure(False, False, options)
+        t2 = self.measure(True, False, options)
+        t3 = self.measure(True, True, options)
+        print(" * without pool:  {:.3f}s, {:.1f} votes/s".format(t1, n / t1))
+        print(" * with pool:     {:.3f}s, {:.1f} votes/s".format(t2, n / t2))
+        print(" * local queries: {:.3f}s, {:.1f} votes/s".format(t3, n / t3))
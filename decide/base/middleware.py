@@ -0,0 +1,79 @@
+import io
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousOperation
+from django.http import JsonResponse
+from django.utils.decorators import decorator_from_middleware
+from django.utils.deprecation import MiddlewareMixin
+
+
+class RequestBodyMiddleware(MiddlewareMixin):
+    """
+    Reads the request bodies that the modules send to each other:
+
+     * chunked (Transfer-Encoding: chunked). Django only reads Content-Length
+       bytes, so the body is read from the wsgi input when the server marks
+       it as terminated (wsgi.input_terminated, gunicorn does), or is
+       de-chunked by a proxy like nginx.
+     * compressed (Content-Encoding: gzip or deflate).
+
+    The bodies, chunked or once decompressed, can't be bigger than
+    settings.MIXNET_MAX_BODY_SIZE, or the response is a 413. It's only used
+    in the views of the mixnet that receive these requests, with the
+    request_body decorator.
+    """
+
+    def process_request(self, request):
+        meta = request.META
+        max_size = settings.MIXNET_MAX_BODY_SIZE
+        chunked = "chunked" in meta.get("HTTP_TRANSFER_ENCODING", "").lower()
+        if chunked and meta.get("wsgi.input_terminated"):
+            body = self.read(meta["wsgi.input"], max_size)
+            if body is None:
+                return self.too_big()
+            self.set_body(request, body)
+        elif max_size is not None and int(meta.get("CONTENT_LENGTH") or 0) > max_size:
+            return self.too_big()
+
+        encoding = meta.get("HTTP_CONTENT_ENCODING", "").lower()
+        if encoding in ("gzip", "deflate"):
+            body = self.decompress(request.read(), encoding, max_size)
+            if body is None:
+                return self.too_big()
+            self.set_body(request, body)
+            del meta["HTTP_CONTENT_ENCODING"]
+
+    def too_big(self):
+        return JsonResponse({"detail": "Request body too big"}, status=413)
+
+    def read(self, stream, max_size):
+        """
+        Reads up to max_size bytes of the stream, or returns None if there
+        are more
+        """
+
+        if max_size is None:
+            return stream.read()
+        body = stream.read(max_size + 1)
+        return body if len(body) <= max_size else None
+
+    def decompress(self, body, encoding, max_size):
+        wbits = 16 + zlib.MAX_WBITS if encoding == "gzip" else zlib.MAX_WBITS
+        d = zlib.decompressobj(wbits)
+        try:
+            data = d.decompress(body, max_size or 0)
+        except zlib.error:
+            raise SuspiciousOperation("Invalid compressed request body")
+        if d.unconsumed_tail:
+            return None
+        return data
+
+    def set_body(self, request, body):
+        request._body = body
+        request._stream = io.BytesIO(body)
+        request._read_started = False
+        request.META["CONTENT_LENGTH"] = str(len(body))
+
+
+request_body = decorator_from_middleware(RequestBodyMiddleware)
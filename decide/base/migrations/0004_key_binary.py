@@ -0,0 +1,62 @@
+# Generated by Django 4.1 on 2026-10-18 09:12
+
+import base.models
+from django.db import migrations
+
+
+FIELDS = ("p", "g", "y", "x")
+BATCH_SIZE = 1000
+
+
+def copy_fields(apps, src, dst):
+    Key = apps.get_model("base", "Key")
+    fields = [f + dst for f in FIELDS]
+    batch = []
+    for key in Key.objects.all().iterator(chunk_size=BATCH_SIZE):
+        for f in FIELDS:
+            setattr(key, f + dst, getattr(key, f + src))
+        batch.append(key)
+        if len(batch) == BATCH_SIZE:
+            Key.objects.bulk_update(batch, fields)
+            batch = []
+    Key.objects.bulk_update(batch, fields)
+
+
+def to_binary(apps, schema_editor):
+    copy_fields(apps, "", "_bin")
+
+
+def to_text(apps, schema_editor):
+    copy_fields(apps, "_bin", "")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0003_auto_20180921_1119"),
+    ]
+
+    operations = [
+        *[
+            migrations.AddField(
+                model_name="key",
+                name=f + "_bin",
+                field=base.models.BigBinField(blank=True, null=True),
+            )
+            for f in FIELDS
+        ],
+        migrations.RunPython(to_binary, to_text),
+        *[migrations.RemoveField(model_name="key", name=f) for f in FIELDS],
+        *[
+            migrations.RenameField(model_name="key", old_name=f + "_bin", new_name=f)
+            for f in FIELDS
+        ],
+        *[
+            migrations.AlterField(
+                model_name="key",
+                name=f,
+                field=base.models.BigBinField(),
+            )
+            for f in ("p", "g", "y")
+        ],
+    ]
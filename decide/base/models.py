@@ -1,3 +1,5 @@
+from django import forms
+from django.core.exceptions import ValidationError
 from django.db import models
 
 
@@ -20,6 +22,56 @@ class BigBigField(models.TextField):
         return int(value)
 
 
+class BigBinField(models.BinaryField):
+    """
+    Big non negative integers stored as big-endian bytes (bytea, blob), so
+    they take less space than the decimal text of BigBigField and are
+    loaded without parsing the digits
+    """
+
+    default_error_messages = {
+        "invalid": "“%(value)s” value must be a non negative integer.",
+    }
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("editable", True)
+        super().__init__(*args, **kwargs)
+
+    def to_python(self, value):
+        if value is None:
+            return 0
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return int.from_bytes(value, "big")
+        try:
+            number = int(str(value))
+        except ValueError:
+            number = -1
+        if number < 0:
+            raise ValidationError(
+                self.error_messages["invalid"], code="invalid", params={"value": value}
+            )
+        return number
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None if self.null else b""
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return bytes(value)
+        value = self.to_python(value)
+        return value.to_bytes((value.bit_length() + 7) // 8, "big")
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return 0
+        return int.from_bytes(value, "big")
+
+    def value_to_string(self, obj):
+        return str(self.value_from_object(obj))
+
+    def formfield(self, **kwargs):
+        return models.Field.formfield(self, **{"widget": forms.Textarea, **kwargs})
+
+
 class Auth(models.Model):
     name = models.CharField(max_length=200)
     url = models.URLField()
@@ -30,10 +82,10 @@ class Auth(models.Model):
 
 
 class Key(models.Model):
-    p = BigBigField()
-    g = BigBigField()
-    y = BigBigField()
-    x = BigBigField(blank=True, null=True)
+    p = BigBinField()
+    g = BigBinField()
+    y = BigBinField()
+    x = BigBinField(blank=True, null=True)
 
     def __str__(self):
         if self.x:
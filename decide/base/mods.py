@@ -1,6 +1,166 @@
+import io
+import json
+import os
+import sys
+import threading
 import urllib
 import requests
 from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.wsgi import WSGIRequest
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_sessions_pid = os.getpid()
+
+
+def get_session(baseurl):
+    """
+    Returns the requests Session used to query this baseurl. There's one
+    Session per baseurl and process, so the connections are kept alive and
+    reused between queries.
+
+    Only the connection errors are retried, a request that reached the
+    server is never sent again.
+    """
+
+    global _sessions_pid
+
+    with _sessions_lock:
+        if _sessions_pid != os.getpid():
+            _sessions.clear()
+            _sessions_pid = os.getpid()
+
+        session = _sessions.get(baseurl)
+        if session is None:
+            retries = Retry(
+                total=settings.MODS_RETRIES,
+                connect=settings.MODS_RETRIES,
+                read=0,
+                status=0,
+                backoff_factor=0.1,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=settings.MODS_POOL_SIZE,
+                max_retries=retries,
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[baseurl] = session
+    return session
+
+
+def is_local(baseurl):
+    """
+    True if the module in baseurl is served by this same deployment and
+    settings.MODS_LOCAL_DISPATCH is enabled
+    """
+
+    if not settings.MODS_LOCAL_DISPATCH:
+        return False
+    return baseurl.rstrip("/") == settings.BASEURL.rstrip("/")
+
+
+def is_local_module(modname):
+    """
+    True if the module modname is installed in this deployment and the
+    queries to it are resolved in this process
+    """
+
+    if modname not in settings.MODULES:
+        return False
+    return is_local(settings.APIS.get(modname, settings.BASEURL))
+
+
+class LocalResponse:
+    """
+    The part of the requests.Response interface used by the modules, for
+    the responses of the views called in this process
+    """
+
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+_handler = None
+
+
+def get_handler():
+    """
+    The django handler that calls the local views, with the middlewares
+    loaded once per process
+    """
+
+    global _handler
+    if _handler is None:
+        handler = BaseHandler()
+        handler.load_middleware()
+        _handler = handler
+    return _handler
+
+
+def local_query(url, method="get", headers=None, json_data=None, data=None):
+    """
+    Calls the view of the url in this process, without any http request.
+    The request goes through the middlewares like a request of the server,
+    with the same headers that query sends.
+    """
+
+    headers = dict(headers or {})
+    if method == "get":
+        body = b""
+    elif data is not None:
+        body = data if isinstance(data, bytes) else b"".join(data)
+    else:
+        body = json.dumps(json_data if json_data is not None else {}).encode()
+        headers.setdefault("Content-Type", "application/json")
+
+    base = urllib.parse.urlsplit(settings.BASEURL)
+    path, _, query_string = url.partition("?")
+    environ = {
+        "REQUEST_METHOD": method.upper(),
+        "SCRIPT_NAME": "",
+        "PATH_INFO": path,
+        "QUERY_STRING": query_string,
+        "SERVER_NAME": base.hostname or "localhost",
+        "SERVER_PORT": str(base.port or (443 if base.scheme == "https" else 80)),
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "HTTP_HOST": base.netloc,
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": base.scheme or "http",
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multiprocess": True,
+        "wsgi.multithread": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in headers.items():
+        key = name.upper().replace("-", "_")
+        if key != "CONTENT_TYPE":
+            key = "HTTP_" + key
+        environ[key] = value
+
+    response = get_handler().get_response(WSGIRequest(environ))
+    if response.streaming:
+        content = b"".join(response.streaming_content)
+    else:
+        content = response.content
+    return LocalResponse(response.status_code, content, response.headers)
 
 
 def query(modname, entry_point="/", method="get", baseurl=None, **kwargs):
@@ -19,7 +179,11 @@ def query(modname, entry_point="/", method="get", baseurl=None, **kwargs):
 
     This function can receive optional parameters to complete the query,
     you can complete the query with GET params using the **params** keyword
-    and with json data, using the **json** keyword.
+    and with json data, using the **json** keyword. Other formats can be
+    sent with the **data** (bytes, or an iterator of bytes for a chunked
+    upload) and **content_type** keywords, and requested with the
+    **accept** keyword. A compressed **data** needs the
+    **content_encoding** keyword.
 
     Examples
 
@@ -35,22 +199,43 @@ def query(modname, entry_point="/", method="get", baseurl=None, **kwargs):
     else:
         mod = baseurl
 
-    q = getattr(requests, method)
-    url = "{}/{}{}".format(mod, modname, entry_point)
+    path = "/{}{}".format(modname, entry_point)
 
     headers = {}
     if "HTTP_AUTHORIZATION" in kwargs:
         headers["Authorization"] = kwargs["HTTP_AUTHORIZATION"]
+    if "accept" in kwargs:
+        headers["Accept"] = kwargs["accept"]
+    if "content_encoding" in kwargs:
+        headers["Content-Encoding"] = kwargs["content_encoding"]
+    data = kwargs.get("data", None)
+    if data is not None:
+        headers["Content-Type"] = kwargs["content_type"]
 
     params = kwargs.get("params", None)
     if params:
-        url += "?{}".format(urllib.parse.urlencode(params))
+        path += "?{}".format(urllib.parse.urlencode(params))
+
+    if is_local(mod):
+        response = local_query(path, method, headers, kwargs.get("json", {}), data)
+        if kwargs.get("response", False):
+            return response
+        return response.json()
 
+    if settings.MODS_POOL:
+        q = getattr(get_session(mod), method)
+    else:
+        q = getattr(requests, method)
+    url = mod + path
+
+    timeout = settings.MODS_TIMEOUT
     if method == "get":
-        response = q(url, headers=headers)
+        response = q(url, headers=headers, timeout=timeout)
+    elif data is not None:
+        response = q(url, data=data, headers=headers, timeout=timeout)
     else:
         json_data = kwargs.get("json", {})
-        response = q(url, json=json_data, headers=headers)
+        response = q(url, json=json_data, headers=headers, timeout=timeout)
 
     if kwargs.get("response", False):
         return response
@@ -81,11 +266,22 @@ def mock_query(client):
 
         q = getattr(client, method)
 
+        extra = {}
+        if "accept" in kwargs:
+            extra["HTTP_ACCEPT"] = kwargs["accept"]
+        if "content_encoding" in kwargs:
+            extra["HTTP_CONTENT_ENCODING"] = kwargs["content_encoding"]
+
         if method == "get":
-            response = q(url, format="json")
+            response = q(url, format="json", **extra)
+        elif kwargs.get("data", None) is not None:
+            data = kwargs["data"]
+            if not isinstance(data, bytes):
+                data = b"".join(data)
+            response = q(url, data=data, content_type=kwargs["content_type"], **extra)
         else:
             json_data = kwargs.get("json", {})
-            response = q(url, data=json_data, format="json")
+            response = q(url, data=json_data, format="json", **extra)
 
         if kwargs.get("response", False):
             return response
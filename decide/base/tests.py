@@ -1,15 +1,45 @@
+import gzip
+import io
+
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.core.exceptions import SuspiciousOperation, ValidationError
+from django.test import RequestFactory, TestCase, override_settings
 from rest_framework.test import APIClient
 from rest_framework.test import APITestCase
 
 from base import mods
+from base.middleware import RequestBodyMiddleware
+from base.models import Key
+from mixnet import keys
+
+
+class QueryPlanMixin:
+    def assertIndexScan(self, queryset):
+        """
+        The query plan of the queryset uses an index. Postgres only uses the
+        indexes for big tables, so the sequential scan is disabled.
+        """
+
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+        plan = queryset.explain().upper()
+        self.assertIn("INDEX", plan)
+        self.assertNotIn("SEQ SCAN", plan)
+        if connection.vendor == "sqlite":
+            self.assertNotIn("SCAN " + queryset.model._meta.db_table.upper(), plan)
 
 
-class BaseTestCase(APITestCase):
+class BaseTestCase(QueryPlanMixin, APITestCase):
     def setUp(self):
         self.client = APIClient()
         self.token = None
         mods.mock_query(self.client)
+        cache.clear()
+        # the rollback of the last test doesn't send the delete signals
+        keys.clear()
 
         user_noadmin = User(username="noadmin")
         user_noadmin.set_password("qwerty")
@@ -33,3 +63,134 @@ class BaseTestCase(APITestCase):
 
     def logout(self):
         self.client.credentials()
+
+
+class ModsSessionTestCase(TestCase):
+    @override_settings(MODS_POOL_SIZE=4, MODS_RETRIES=2)
+    def test_get_session(self):
+        s1 = mods.get_session("http://decide-test-1")
+        s2 = mods.get_session("http://decide-test-2")
+        self.assertIs(s1, mods.get_session("http://decide-test-1"))
+        self.assertIsNot(s1, s2)
+
+        adapter = s1.get_adapter("http://decide-test-1/voting/")
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertEqual(adapter.max_retries.connect, 2)
+        self.assertEqual(adapter.max_retries.read, 0)
+
+
+class ModsLocalTestCase(BaseTestCase):
+    def test_is_local(self):
+        with override_settings(MODS_LOCAL_DISPATCH=True, BASEURL="http://a:8000"):
+            self.assertTrue(mods.is_local("http://a:8000"))
+            self.assertTrue(mods.is_local("http://a:8000/"))
+            self.assertFalse(mods.is_local("http://b:8000"))
+        with override_settings(MODS_LOCAL_DISPATCH=False, BASEURL="http://a:8000"):
+            self.assertFalse(mods.is_local("http://a:8000"))
+
+    def test_local_query(self):
+        self.login()
+        token = "Token " + self.token
+
+        response = mods.local_query(
+            "/authentication/getuser/", "post", json_data={"token": self.token}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["username"], "admin")
+
+        response = mods.local_query(
+            "/authentication/getuser/", "post", json_data={"token": "bad"}
+        )
+        self.assertEqual(response.status_code, 404)
+
+        headers = {"Authorization": token}
+        response = mods.local_query("/store/?voting_id=1", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), self.client.get("/store/?voting_id=1").json())
+
+        response = mods.local_query("/store/?voting_id=1")
+        self.assertEqual(response.status_code, 401)
+
+    def test_local_query_not_found(self):
+        response = mods.local_query("/mixnet/shuffle/1/", "post", json_data={})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {"detail": "Not found."})
+
+
+class BigBinFieldTestCase(TestCase):
+    def test_key(self):
+        p = 2**2048 - 1
+        key = Key(p=p, g=2, y=0)
+        key.save()
+        key = Key.objects.get(pk=key.pk)
+        self.assertEqual(key.p, p)
+        self.assertEqual(key.g, 2)
+        self.assertEqual(key.y, 0)
+        self.assertEqual(key.x, 0)
+
+        field = Key._meta.get_field("p")
+        self.assertEqual(len(field.get_prep_value(p)), 256)
+        for value in (-1, "x"):
+            with self.assertRaises(ValidationError):
+                field.get_prep_value(value)
+        self.assertEqual(field.to_python(str(p)), p)
+        self.assertEqual(field.value_to_string(key), str(p))
+
+
+class RequestBodyMiddlewareTestCase(TestCase):
+    def get_body(self, **extra):
+        request = RequestFactory().post(
+            "/", data=gzip.compress(b"body"), content_type="text/plain", **extra
+        )
+        middleware = RequestBodyMiddleware(lambda request: request.body)
+        return middleware(request)
+
+    def test_compressed(self):
+        self.assertEqual(self.get_body(HTTP_CONTENT_ENCODING="gzip"), b"body")
+        with override_settings(MIXNET_MAX_BODY_SIZE=30):
+            response = self.get_body(HTTP_CONTENT_ENCODING="gzip")
+        self.assertEqual(response, b"body")
+        with override_settings(MIXNET_MAX_BODY_SIZE=2):
+            response = self.get_body(HTTP_CONTENT_ENCODING="gzip")
+        self.assertEqual(response.status_code, 413)
+        with self.assertRaises(SuspiciousOperation):
+            self.get_body(HTTP_CONTENT_ENCODING="deflate")
+
+    def test_big_body(self):
+        # bigger than the 2.5MB of DATA_UPLOAD_MAX_MEMORY_SIZE
+        body = b"1" * (3 * 1024**2)
+        request = RequestFactory().post("/", data=body, content_type="text/plain")
+        middleware = RequestBodyMiddleware(lambda request: request.read())
+        self.assertEqual(middleware(request), body)
+
+        request = RequestFactory().post(
+            "/",
+            data=gzip.compress(body),
+            content_type="text/plain",
+            HTTP_CONTENT_ENCODING="gzip",
+        )
+        self.assertEqual(middleware(request), body)
+
+    def test_chunked(self):
+        # the wsgi server doesn't set the length of the chunked requests
+        extra = {
+            "CONTENT_LENGTH": "",
+            "HTTP_TRANSFER_ENCODING": "chunked",
+            "HTTP_CONTENT_ENCODING": "gzip",
+            "wsgi.input_terminated": True,
+            "wsgi.input": io.BytesIO(gzip.compress(b"body")),
+        }
+        self.assertEqual(self.get_body(**extra), b"body")
+        extra["wsgi.input"] = io.BytesIO(gzip.compress(b"body"))
+        with override_settings(MIXNET_MAX_BODY_SIZE=10):
+            response = self.get_body(**extra)
+        self.assertEqual(response.status_code, 413)
+
+    def test_only_mixnet_views(self):
+        response = self.client.post(
+            "/authentication/login/",
+            data=gzip.compress(b'{"username": "a", "password": "b"}'),
+            content_type="application/json",
+            HTTP_CONTENT_ENCODING="gzip",
+        )
+        self.assertEqual(response.status_code, 400)
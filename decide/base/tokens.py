@@ -0,0 +1,51 @@
+"""
+Cache of the users of the auth tokens.
+
+The permissions and the store need the user of a token for each request,
+that is a query to authentication/getuser. The user returned by getuser is
+stored in the django cache, with the key token:<key>, for
+settings.TOKEN_CACHE_TTL seconds. The authentication module removes the
+entries when the tokens are deleted or the users change, but only from
+the cache of its own process. The other processes, and other deployments,
+only drop them after the ttl: a token revoked by a logout can still be
+accepted for up to TOKEN_CACHE_TTL seconds, unless the cache is shared by
+all the processes (redis, memcached).
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+
+from base import mods
+
+
+KEY = "token:{}"
+
+
+def getuser(token):
+    response = mods.post("authentication/getuser", json={"token": token}, response=True)
+    if response.status_code != 200:
+        return None
+    return response.json()
+
+
+def get_user(token, load=getuser):
+    """
+    Returns the user of the token as returned by authentication/getuser,
+    or None if the token doesn't exist. The user is loaded with load on a
+    cache miss.
+    """
+
+    if not token:
+        return None
+
+    key = KEY.format(token)
+    user = cache.get(key)
+    if user is None:
+        user = load(token)
+        if user is not None:
+            cache.set(key, user, settings.TOKEN_CACHE_TTL)
+    return user
+
+
+def invalidate(*tokens):
+    cache.delete_many([KEY.format(token) for token in tokens])
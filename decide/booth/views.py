@@ -6,7 +6,7 @@ from django.http import Http404, HttpResponseNotFound, HttpResponse
 from django.core.exceptions import PermissionDenied
 from django.utils import timezone
 
-from base import mods
+from voting import cache as voting_cache
 from voting.models import Voting
 from census.models import Census
 
@@ -35,10 +35,11 @@ class BoothView(TemplateView):
                 raise PermissionDenied()
             # Check if voting exists and is active
             vid = kwargs.get("voting_id", 0)
-            voting_exists = Voting.objects.filter(
-                id=vid, start_date__isnull=False, start_date__lte=timezone.now()
-            ).exists()
-            if not voting_exists:
+            voting = voting_cache.get_voting(vid)
+            if not voting:
+                raise Http404()
+            start_date, _ = voting_cache.get_dates(voting)
+            if not start_date or start_date > timezone.now():
                 raise Http404()
             # Check if user is in census
             user_census_exists = Census.objects.filter(
@@ -46,12 +47,11 @@ class BoothView(TemplateView):
             ).exists()
             if not user_census_exists:
                 raise PermissionDenied()
-            r = mods.get("voting", params={"id": vid})
             # Casting numbers to string to manage in javascript with BigInt
             # and avoid problems with js and big number conversions
-            for k, v in r[0]["pub_key"].items():
-                r[0]["pub_key"][k] = str(v)
-            context["voting"] = json.dumps(r[0])
+            for k, v in voting["pub_key"].items():
+                voting["pub_key"][k] = str(v)
+            context["voting"] = json.dumps(voting)
         except Exception as e:
             context["failed"] = True
             context["http_error"] = e
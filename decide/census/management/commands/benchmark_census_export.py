@@ -0,0 +1,88 @@
+import csv
+import resource
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from census.models import Census
+from census.views import CensusExportationToCSV
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the census csv export: time and peak memory of the "
+        "streaming export, with and without gzip, and of the old export "
+        "that builds the whole csv in memory. The census of the voting is "
+        "created first and deleted at the end, so it must be a voting "
+        "without census. The peak memory of a "
+        "process never goes down, so the old export is measured the last."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000000)
+        parser.add_argument("--voting", type=int, default=999999)
+        parser.add_argument("--skip-full", action="store_true")
+
+    def maxrss(self):
+        # kilobytes in linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    def create_census(self, voting, n):
+        batch_size = settings.CENSUS_BATCH_SIZE
+        rows = (Census(voting_id=voting, voter_id=i) for i in range(1, n + 1))
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            Census.objects.bulk_create(batch, ignore_conflicts=True)
+
+    def streaming(self, voting, gzip=False):
+        request = RequestFactory().post(
+            "/census/export-to-csv/", {"voting_id": voting, "gzip": gzip or ""}
+        )
+        request.user = User(is_staff=True, is_superuser=True)
+        response = CensusExportationToCSV.as_view()(request)
+        return sum(len(chunk) for chunk in response.streaming_content)
+
+    def full(self, voting):
+        # the export before the streaming response
+        response = HttpResponse(content_type="text/csv")
+        writer = csv.writer(response)
+        writer.writerow(["Voting", "Voter"])
+        for profile in Census.objects.filter(voting_id=voting):
+            writer.writerow([profile.voting_id, profile.voter_id])
+        return len(response.content)
+
+    def measure(self, name, fn, *args):
+        t = time.perf_counter()
+        size = fn(*args)
+        t = time.perf_counter() - t
+        print(
+            " * {:10} {:8.2f}s {:8.1f} MB {:8.1f} MB peak rss".format(
+                name, t, size / 2**20, self.maxrss()
+            )
+        )
+
+    def handle(self, *args, **options):
+        voting = options["voting"]
+        n = options["rows"]
+        if Census.objects.filter(voting_id=voting).exists():
+            raise CommandError(
+                "The voting {} has a census, use other --voting".format(voting)
+            )
+
+        print("creating {} census rows".format(n))
+        self.create_census(voting, n)
+        try:
+            print(" * {:10} {:8.1f} MB peak rss".format("start", self.maxrss()))
+            self.measure("streaming", self.streaming, voting)
+            self.measure("gzip", self.streaming, voting, True)
+            if not options["skip_full"]:
+                self.measure("full", self.full, voting)
+        finally:
+            Census.objects.filter(voting_id=voting).delete()
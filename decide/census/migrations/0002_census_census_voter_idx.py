@@ -0,0 +1,17 @@
+# Generated by Django 4.1 on 2026-10-18 08:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("census", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="census",
+            index=models.Index(fields=["voter_id"], name="census_voter_idx"),
+        ),
+    ]
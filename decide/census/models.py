@@ -1,4 +1,7 @@
-from django.db import models
+from itertools import chain, islice
+
+from django.conf import settings
+from django.db import connection, models, transaction
 
 
 class Census(models.Model):
@@ -7,3 +10,41 @@ class Census(models.Model):
 
     class Meta:
         unique_together = (("voting_id", "voter_id"),)
+        indexes = [models.Index(fields=["voter_id"], name="census_voter_idx")]
+
+
+def add_voters(pairs, batch_size=None):
+    """
+    Adds the (voting_id, voter_id) pairs to the census, in batches of
+    batch_size rows, ignoring the voters that are already in the census.
+
+    Returns the number of inserted and duplicated voters. The inserted
+    voters are the rows counted by the database in each INSERT ... ON
+    CONFLICT DO NOTHING, so the count is right with other imports of the
+    same votings at the same time.
+    """
+
+    pairs = list(pairs)
+    unique = list(set(pairs))
+    fields = ["voting_id", "voter_id"]
+    batch_size = min(
+        batch_size or settings.CENSUS_BATCH_SIZE,
+        connection.ops.bulk_batch_size(fields, unique) or 1,
+    )
+    sql = "INSERT INTO {} ({}) VALUES {{}} ON CONFLICT DO NOTHING".format(
+        connection.ops.quote_name(Census._meta.db_table),
+        ", ".join(connection.ops.quote_name(f) for f in fields),
+    )
+
+    inserted = 0
+    rows = iter(unique)
+    with transaction.atomic(), connection.cursor() as cursor:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            values = ", ".join(["(%s, %s)"] * len(batch))
+            cursor.execute(sql.format(values), list(chain.from_iterable(batch)))
+            inserted += cursor.rowcount
+
+    return inserted, len(pairs) - inserted
@@ -1,4 +1,6 @@
+import gzip
 from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
 from rest_framework.test import APIClient
 from django.contrib.staticfiles.testing import StaticLiveServerTestCase
@@ -9,7 +11,7 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.keys import Keys
 
-from .models import Census
+from .models import Census, add_voters
 from base import mods
 from base.tests import BaseTestCase
 from datetime import datetime
@@ -81,6 +83,51 @@ class CensusTestCase(BaseTestCase):
         self.assertEqual(response.status_code, 201)
         self.assertEqual(len(data.get("voters")), Census.objects.count() - 1)
 
+    def test_bulk_add_voters(self):
+        data = {"voting_id": 1, "voters": [1, 2, 3, 3, 4]}
+        response = self.client.post("/census/bulk/", data, format="json")
+        self.assertEqual(response.status_code, 401)
+
+        self.login(user="noadmin")
+        response = self.client.post("/census/bulk/", data, format="json")
+        self.assertEqual(response.status_code, 403)
+
+        self.login()
+        response = self.client.post("/census/bulk/", data, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {"inserted": 3, "duplicates": 2})
+        self.assertEqual(Census.objects.filter(voting_id=1).count(), 4)
+        self.assertEqual(add_voters([(1, 4), (1, 5), (1, 6)], batch_size=2), (2, 1))
+
+        data = {"voting_id": 1, "voters": ["a"]}
+        response = self.client.post("/census/bulk/", data, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_add_voters_csv(self):
+        self.login()
+        upload = SimpleUploadedFile("census.csv", b"Voting,Voter\n2,1\n2,5\n1,1\n")
+        response = self.client.post("/census/bulk/", {"file": upload})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {"inserted": 2, "duplicates": 1})
+
+        upload = SimpleUploadedFile("census.csv", b"5\n6\n")
+        data = {"file": upload, "voting_id": 3}
+        response = self.client.post("/census/bulk/", data)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {"inserted": 2, "duplicates": 0})
+        self.assertEqual(Census.objects.filter(voting_id=3).count(), 2)
+
+        upload = SimpleUploadedFile("census.csv", b"5\n6\n")
+        response = self.client.post("/census/bulk/", {"file": upload})
+        self.assertEqual(response.status_code, 400)
+
+    def test_census_index(self):
+        Census.objects.bulk_create(
+            [Census(voting_id=i % 10, voter_id=i) for i in range(2, 1000)]
+        )
+        self.assertIndexScan(Census.objects.filter(voting_id=1, voter_id=11))
+        self.assertIndexScan(Census.objects.filter(voter_id=11))
+
     def test_destroy_voter(self):
         data = {"voters": [1]}
         response = self.client.delete("/census/{}/".format(1), data, format="json")
@@ -164,6 +211,31 @@ class CensusExportationTests(BaseTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response["Content-Type"], "text/csv")
 
+    def test_post_request_export_content(self):
+        Census.objects.bulk_create(
+            [Census(voting_id=1, voter_id=i) for i in range(1, 6)]
+            + [Census(voting_id=2, voter_id=1)]
+        )
+        user = User.objects.create_superuser(
+            "testadmin", "admin@example.com", "testadmin"
+        )
+        request = self.factory.post("census/export-to-csv/", {"voting_id": 1})
+        request.user = user
+        with self.settings(CENSUS_EXPORT_CHUNK_SIZE=2):
+            response = CensusExportationToCSV.as_view()(request)
+            content = b"".join(response.streaming_content).decode()
+        rows = content.splitlines()
+        self.assertEqual(rows[0], "Voting,Voter")
+        self.assertEqual(sorted(rows[1:]), ["1,{}".format(i) for i in range(1, 6)])
+
+        request = self.factory.post("census/export-all-census/", {"gzip": "1"})
+        request.user = user
+        response = CensusExportationToCSV.as_view()(request)
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertIn("CensoCompleto.csv.gz", response["Content-Disposition"])
+        content = gzip.decompress(b"".join(response.streaming_content)).decode()
+        self.assertEqual(len(content.splitlines()), 7)
+
     def test_post_request_unauthorized_export_all(self):
         # Para un usuario que no es staff ni superuser
         user = User.objects.create_user("testuser", "testuser")
@@ -3,6 +3,7 @@ from . import views
 
 urlpatterns = [
     path("", views.CensusCreate.as_view(), name="census_create"),
+    path("bulk/", views.CensusBulkCreate.as_view(), name="census_bulk"),
     path("<int:voting_id>/", views.CensusDetail.as_view(), name="census_detail"),
     path("descargar-csv/", views.CensusExportationToCSV.as_view(), name="export_page"),
     path(
@@ -2,17 +2,22 @@ from typing import Any
 from django.db.utils import IntegrityError
 from django.core.exceptions import ObjectDoesNotExist
 from rest_framework import generics
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.response import Response
 from rest_framework.status import (
     HTTP_201_CREATED as ST_201,
+    HTTP_400_BAD_REQUEST as ST_400,
     HTTP_204_NO_CONTENT as ST_204,
     HTTP_401_UNAUTHORIZED as ST_401,
     HTTP_409_CONFLICT as ST_409,
 )
 import csv
+import io
+import zlib
 from base.perms import UserIsStaff
-from .models import Census
-from django.http import HttpResponse, HttpResponseForbidden
+from .models import Census, add_voters
+from django.conf import settings
+from django.http import HttpResponseForbidden, StreamingHttpResponse
 from django.shortcuts import render
 from voting.models import Voting
 from django.views.generic.base import TemplateView
@@ -46,15 +51,46 @@ class CensusExportationToCSV(TemplateView):
             if voting_id
             else Census.objects.all()
         )
-        response = HttpResponse(content_type="text/csv")
+        content = census_csv(census, settings.CENSUS_EXPORT_CHUNK_SIZE)
+        content_type = "text/csv"
+        if request.POST.get("gzip"):
+            content = gzip_stream(content)
+            content_type = "application/gzip"
+            filename += ".gz"
+        response = StreamingHttpResponse(content, content_type=content_type)
         response["Content-Disposition"] = f'attachment; filename="{filename}"'
-        writer = csv.writer(response)
-        writer.writerow(["Voting", "Voter"])
-        for profile in census:
-            writer.writerow([profile.voting_id, profile.voter_id])
         return response
 
 
+def census_csv(census, chunk_size):
+    """
+    Yields the census as csv, chunk_size rows each time. The rows are read
+    with a server side cursor when the database supports it, so the memory
+    doesn't grow with the census.
+    """
+
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["Voting", "Voter"])
+    rows = census.values_list("voting_id", "voter_id").iterator(chunk_size=chunk_size)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % chunk_size == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def gzip_stream(chunks):
+    z = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = z.compress(chunk.encode())
+        if data:
+            yield data
+    yield z.flush()
+
+
 class CensusCreate(generics.ListCreateAPIView):
 
     permission_classes = (UserIsStaff,)
@@ -78,6 +114,54 @@ class CensusCreate(generics.ListCreateAPIView):
         return Response({"voters": voters})
 
 
+class CensusBulkCreate(generics.CreateAPIView):
+    """
+    Adds a big list of voters to the census.
+
+    * voting_id: id
+    * voters: [id], or
+    * file: csv with a voter id in each row, or the voting id and the voter
+      id as exported by CensusExportationToCSV. Rows that aren't numbers,
+      like the header, are skipped.
+
+    The voters already in the census are ignored and counted as duplicates.
+    """
+
+    permission_classes = (UserIsStaff,)
+    parser_classes = (JSONParser, MultiPartParser, FormParser)
+
+    def create(self, request, *args, **kwargs):
+        voting_id = request.data.get("voting_id")
+        upload = request.FILES.get("file")
+        try:
+            voting_id = int(voting_id) if voting_id else None
+            if upload:
+                pairs = list(self.read_csv(upload, voting_id))
+            else:
+                voters = request.data.get("voters") or []
+                pairs = [(voting_id, int(voter)) for voter in voters]
+        except (TypeError, ValueError):
+            return Response("Invalid census", status=ST_400)
+
+        if any(v is None for v, _ in pairs):
+            return Response("Invalid census", status=ST_400)
+
+        inserted, duplicates = add_voters(pairs)
+        return Response({"inserted": inserted, "duplicates": duplicates}, status=ST_201)
+
+    def read_csv(self, upload, voting_id):
+        for row in csv.reader(io.TextIOWrapper(upload, encoding="utf-8")):
+            row = [value.strip() for value in row if value.strip()]
+            if not row or not all(value.isdigit() for value in row):
+                continue
+            if len(row) == 1:
+                yield voting_id, int(row[0])
+            elif len(row) == 2:
+                yield int(row[0]), int(row[1])
+            else:
+                raise ValueError(row)
+
+
 class CensusDetail(generics.RetrieveDestroyAPIView):
     def destroy(self, request, voting_id, *args, **kwargs):
         voters = request.data.get("voters")
@@ -192,9 +192,81 @@ TEST_RUNNER = "django_nose.NoseTestSuiteRunner"
 
 STATIC_URL = "/static/"
 
+# queries between modules (base.mods): keep-alive connection pool per module
+# url, connection retries and (connect, read) timeout in seconds
+MODS_POOL = True
+MODS_POOL_SIZE = 10
+MODS_RETRIES = 3
+MODS_TIMEOUT = (10, None)
+# queries to modules in BASEURL are resolved in this process, without http
+MODS_LOCAL_DISPATCH = True
+
 # number of bits for the key, all auths should use the same number of bits
 KEYBITS = 256
 
+# number of processes used by the mixnet to shuffle and decrypt, 1 disables
+# the process pool
+MIXNET_WORKERS = 1
+# format of the msgs sent to the mixnets, "binary" (mixnet.codec) or "json".
+# The binary requests fall back to json if the other mixnet doesn't know it
+MIXNET_FORMAT = "binary"
+# the requests to other mixnets are gzip compressed, and sent with chunked
+# transfer encoding in chunks of MIXNET_UPLOAD_CHUNK_SIZE bytes, 0 disables it
+MIXNET_COMPRESS = True
+MIXNET_UPLOAD_CHUNK_SIZE = 0
+# max size of the bodies of the shuffle and decrypt requests, chunked or
+# once decompressed. As client_max_body_size in docker/docker-nginx.conf
+MIXNET_MAX_BODY_SIZE = 512 * 1024**2
+# big integer arithmetic of the mixnet: "gmpy2" (if installed), "pycryptodome",
+# "python" or "auto": gmpy2 if it's installed, pycryptodome only if it's built
+# with GMP, and the builtin pow if not
+MIXNET_BACKEND = "auto"
+# mixnets kept by each process with their key ready to use, 0 disables it
+MIXNET_KEY_CACHE_SIZE = 128
+# with MIXNET_CHAIN each auth calls the next one during the tally, if not the
+# voting calls each auth in turn
+MIXNET_CHAIN = True
+
+# number of votes read from the store and sent to the mixnet in each request
+# during the tally, 0 sends all the votes at once. Each chunk is shuffled on
+# its own, so a vote is only anonymous among the votes of its chunk: smaller
+# chunks use less memory but give a smaller anonymity set. The chunks are
+# never smaller than TALLY_MIN_CHUNK_SIZE votes
+TALLY_CHUNK_SIZE = 0
+TALLY_MIN_CHUNK_SIZE = 1000
+# number of chunks in the mixnets at the same time during the tally
+TALLY_PIPELINE = 1
+# max number of votes in each page of the store, see TALLY_CHUNK_SIZE
+STORE_MAX_LIMIT = 10000
+
+# the votings metadata used by the store, the booth and the visualizer is
+# cached for VOTING_CACHE_TTL seconds, and removed when the voting changes.
+# LocMemCache is per process: with several workers use a shared cache
+# (redis, memcached) so the changes are seen by all of them
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+VOTING_CACHE_TTL = 300
+
+# the users of the auth tokens are cached for TOKEN_CACHE_TTL seconds. It's
+# also the delay for a revoked token to be rejected by the other processes
+TOKEN_CACHE_TTL = 10
+
+# number of rows inserted by each query in the bulk census import
+CENSUS_BATCH_SIZE = 5000
+# number of rows read from the database for each chunk of the csv export
+CENSUS_EXPORT_CHUNK_SIZE = 2000
+
+# run the tallies in a background thread pool instead of inside the request
+TALLY_BACKGROUND = True
+TALLY_JOB_WORKERS = 1
+# seconds without changes in the status of a running tally before it can be
+# started again, the job was lost. Longer than the slowest chunk
+TALLY_STALE_TIMEOUT = 1800
+
 # Versioning
 ALLOWED_VERSIONS = ["v1", "v2"]
 DEFAULT_VERSION = "v1"
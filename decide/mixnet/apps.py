@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class MixnetConfig(AppConfig):
     default_auto_field = "django.db.models.AutoField"
     name = "mixnet"
+
+    def ready(self):
+        from . import arith
+
+        arith.use(settings.MIXNET_BACKEND)
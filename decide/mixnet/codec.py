@@ -0,0 +1,175 @@
+"""
+Binary encoding of the mixnet messages.
+
+The shuffle and decrypt requests carry lists of big integers, that in json
+are long decimal numbers to print and parse. With this encoding the body
+is:
+
+ * 4 bytes, big-endian: length of the header
+ * header: json object with all the fields but msgs, and the shape of the
+   msgs, {"n": count, "arity": 1 or 2, "width": bytes per integer}
+ * msgs: n * arity integers of width bytes, big-endian
+
+The Shuffle and Decrypt views accept and return this format when the
+request uses MEDIA_TYPE as Content-Type or Accept, and json otherwise.
+"""
+
+import json
+import struct
+import zlib
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+
+from base import mods
+
+
+MEDIA_TYPE = "application/x-decide-mixnet"
+HEADER = struct.Struct(">I")
+
+
+def dumps(data):
+    """
+    Encodes a dict with a msgs list of ints or of [int, int], or just the
+    list of msgs
+    """
+
+    if isinstance(data, (list, tuple)):
+        data = {"msgs": data}
+    header = {k: v for k, v in data.items() if k != "msgs"}
+    payload = b""
+
+    msgs = data.get("msgs")
+    if msgs is not None:
+        if msgs and isinstance(msgs[0], (list, tuple)):
+            arity = len(msgs[0])
+            values = [int(v) for m in msgs for v in m]
+        else:
+            arity = 1
+            values = [int(m) for m in msgs]
+        width = max((v.bit_length() + 7) // 8 for v in values) if values else 0
+        width = max(width, 1)
+        header["msgs"] = {"n": len(msgs), "arity": arity, "width": width}
+        payload = b"".join(v.to_bytes(width, "big") for v in values)
+
+    header = json.dumps(header).encode("utf-8")
+    return HEADER.pack(len(header)) + header + payload
+
+
+def loads(content):
+    content = memoryview(content)
+    (size,) = HEADER.unpack_from(content)
+    start = HEADER.size + size
+    data = json.loads(bytes(content[HEADER.size : start]))
+
+    shape = data.pop("msgs", None)
+    if shape is not None:
+        n, arity, width = shape["n"], shape["arity"], shape["width"]
+        payload = content[start:]
+        if len(payload) != n * arity * width:
+            raise ValueError("Wrong msgs length")
+        values = [
+            int.from_bytes(payload[i : i + width], "big")
+            for i in range(0, len(payload), width)
+        ]
+        if arity == 1:
+            data["msgs"] = values
+        else:
+            data["msgs"] = [values[i : i + arity] for i in range(0, len(values), arity)]
+    return data
+
+
+class MixnetParser(BaseParser):
+    media_type = MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return loads(stream.read())
+        except (ValueError, KeyError, TypeError, struct.error) as e:
+            raise ParseError("Mixnet parse error - %s" % str(e))
+
+
+class MixnetRenderer(BaseRenderer):
+    media_type = MEDIA_TYPE
+    format = "mixnet"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return dumps(data)
+
+
+def decode(response):
+    """
+    Data of a response of the mixnet, in any of the formats
+    """
+
+    content_type = response.headers.get("Content-Type", "")
+    if content_type.startswith(MEDIA_TYPE):
+        data = loads(response.content)
+        return data["msgs"] if "msgs" in data else data
+    return response.json()
+
+
+def compress(body):
+    z = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    return z.compress(body) + z.flush()
+
+
+def chunks(body, size):
+    body = memoryview(body)
+    for i in range(0, len(body), size):
+        yield body[i : i + size]
+
+
+def send(entry_point, baseurl, body, content_type, accept=None):
+    """
+    Posts the body to the mixnet in baseurl. The bodies sent to other
+    servers are compressed with settings.MIXNET_COMPRESS, and sent in
+    chunks with settings.MIXNET_UPLOAD_CHUNK_SIZE. The binary format isn't
+    compressed, the ciphertexts are random bytes that gzip can't reduce.
+    """
+
+    kwargs = {}
+    if accept:
+        kwargs["accept"] = accept
+    if not mods.is_local(baseurl):
+        if settings.MIXNET_COMPRESS and content_type != MEDIA_TYPE:
+            body = compress(body)
+            kwargs["content_encoding"] = "gzip"
+        if settings.MIXNET_UPLOAD_CHUNK_SIZE:
+            body = chunks(body, settings.MIXNET_UPLOAD_CHUNK_SIZE)
+
+    return mods.post(
+        "mixnet",
+        entry_point=entry_point,
+        baseurl=baseurl,
+        data=body,
+        content_type=content_type,
+        response=True,
+        **kwargs,
+    )
+
+
+def post(entry_point, baseurl, data):
+    """
+    Posts data to the mixnet module in baseurl in the settings.MIXNET_FORMAT
+    format. If the other mixnet doesn't accept the binary format the
+    request is sent again in json, and the data without a msgs list is
+    always sent in json.
+    """
+
+    binary = isinstance(data.get("msgs"), (list, tuple))
+    if settings.MIXNET_FORMAT == "binary" and binary:
+        accept = MEDIA_TYPE + ", application/json;q=0.5"
+        response = send(entry_point, baseurl, dumps(data), MEDIA_TYPE, accept)
+        if response.status_code not in (406, 415):
+            return decode(response)
+
+    body = json.dumps(data).encode("utf-8")
+    response = send(entry_point, baseurl, body, "application/json")
+    return decode(response)
@@ -0,0 +1,89 @@
+"""
+Per-process cache of the mixnets with their keys ready to use.
+
+A tally in chunks sends the shuffle and decrypt requests of the same
+mixnet again and again. Instead of loading the mixnet and its key from the
+database and building the ElGamal key in each request, the mixnets are
+kept here by (voting_id, auth_position), up to
+settings.MIXNET_KEY_CACHE_SIZE, with the key and its tables already built.
+
+The entries are removed when the mixnet or its key are saved or deleted in
+this process (see the receivers in mixnet.models). The other processes
+don't get those signals, so each lookup checks the cached mixnet against
+its row, with a query of its pk, its keys and the public value of its key,
+and loads it again if any of them changed. A rolled back transaction
+doesn't send the signals, so the tests clear() the cache in their setUp.
+"""
+
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.http import Http404
+
+
+_mixnets = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_mixnet(voting_id, position=0):
+    """
+    The mixnet of this auth in the voting, with its key loaded and the
+    MixCrypt built. Raises Http404 if it doesn't exist.
+    """
+
+    from .models import Mixnet
+
+    index = (int(voting_id), int(position))
+    mixnets = Mixnet.objects.filter(voting_id=voting_id, auth_position=position)
+    with _lock:
+        mn = _mixnets.get(index)
+    if mn is not None:
+        row = mixnets.values_list("pk", "key_id", "pubkey_id", "key__y").first()
+        if row == version(mn):
+            with _lock:
+                if index in _mixnets:
+                    _mixnets.move_to_end(index)
+            return mn
+        invalidate(*index)
+
+    mn = mixnets.select_related("key").first()
+    if mn is None:
+        raise Http404("No Mixnet matches the given query.")
+    if mn.key:
+        mn.crypt
+
+    size = settings.MIXNET_KEY_CACHE_SIZE
+    if size:
+        with _lock:
+            _mixnets[index] = mn
+            while len(_mixnets) > size:
+                _mixnets.popitem(last=False)
+    return mn
+
+
+def version(mn):
+    """
+    What is checked of a cached mixnet against its row
+    """
+
+    return (mn.pk, mn.key_id, mn.pubkey_id, mn.key.y if mn.key else None)
+
+
+def invalidate(voting_id=None, position=None, key_id=None):
+    """
+    Removes the mixnet of the voting and position, and the mixnets with
+    the key key_id
+    """
+
+    with _lock:
+        for index, mn in list(_mixnets.items()):
+            if index == (voting_id, position) or (
+                key_id is not None and key_id in (mn.key_id, mn.pubkey_id)
+            ):
+                del _mixnets[index]
+
+
+def clear():
+    with _lock:
+        _mixnets.clear()
@@ -0,0 +1,66 @@
+import random
+import time
+
+from Crypto.Util.number import getPrime
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from mixnet import arith
+from mixnet.mixcrypt import decrypt_batch, fixed_base, reencrypt_chunk
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the arith backends of the mixnet for each key size: "
+        "exponentiations, reencryptions and decryptions per second. The "
+        "modulus is a random prime instead of a safe prime, that takes "
+        "too long to generate for the big sizes and costs the same to use."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--bits", nargs="+", type=int, default=[256, 1024, 2048, 3072]
+        )
+        parser.add_argument("--votes", type=int, default=500)
+        parser.add_argument("--backends", nargs="+", default=arith.available())
+
+    def measure(self, n, fn, *args):
+        t = time.perf_counter()
+        fn(*args)
+        return n / (time.perf_counter() - t)
+
+    def powmods(self, g, exps, p):
+        return [arith.powmod(g, e, p) for e in exps]
+
+    def handle(self, *args, **options):
+        n = options["votes"]
+        print(
+            "{:>6} {:14} {:>12} {:>12} {:>12}".format(
+                "bits", "backend", "powmod/s", "reencrypt/s", "decrypt/s"
+            )
+        )
+        try:
+            for bits in options["bits"]:
+                p = getPrime(bits)
+                g = random.randrange(2, p - 1)
+                x = random.getrandbits(bits - 1)
+                y = pow(g, x, p)
+                exps = [random.getrandbits(bits - 1) for i in range(n)]
+                ciphers = [(pow(g, e, p), (y * e) % p) for e in exps]
+
+                for name in options["backends"]:
+                    arith.use(name)
+                    # the tables are built once per key, out of the measure
+                    fixed_base(g, p)
+                    fixed_base(y, p)
+                    print(
+                        "{:>6} {:14} {:>12.1f} {:>12.1f} {:>12.1f}".format(
+                            bits,
+                            name,
+                            self.measure(n, self.powmods, g, exps, p),
+                            self.measure(n, reencrypt_chunk, ciphers, p, g, y),
+                            self.measure(n, decrypt_batch, ciphers, p, g, x),
+                        )
+                    )
+        finally:
+            arith.use(settings.MIXNET_BACKEND)
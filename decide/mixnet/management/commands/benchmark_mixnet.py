@@ -0,0 +1,82 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from mixnet.mixcrypt import MixCrypt, decrypt_batch, fixed_base, rand
+
+
+class Command(BaseCommand):
+    help = "Benchmark the mixnet re-encryption and decryption strategies"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--votes",
+            nargs="+",
+            type=int,
+            default=[10000, 100000, 1000000],
+            help="number of re-encryptions to run for each measure",
+        )
+        parser.add_argument("--bits", type=int, default=settings.KEYBITS)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.MIXNET_WORKERS,
+            help="processes used by the batch reencryption",
+        )
+
+    def reencrypt_pow(self, k, ciphers):
+        p, g, y = int(k.p), int(k.g), int(k.y)
+        out = []
+        for a, b in ciphers:
+            r = rand(p)
+            out.append(((a * pow(g, r, p)) % p, (b * pow(y, r, p)) % p))
+        return out
+
+    def reencrypt_fixed_base(self, crypt, ciphers):
+        return [crypt.reencrypt(c) for c in ciphers]
+
+    def reencrypt_batch(self, crypt, ciphers, workers):
+        k = crypt.k
+        return crypt.reencrypt_batch(ciphers, (k.p, k.g, k.y), workers)
+
+    def decrypt_loop(self, k, ciphers):
+        return [k._decrypt(c) for c in ciphers]
+
+    def decrypt_batch(self, k, ciphers):
+        return decrypt_batch(ciphers, k.p, k.g, k.x)
+
+    def measure(self, fn, *args):
+        t = time.perf_counter()
+        fn(*args)
+        return time.perf_counter() - t
+
+    def handle(self, *args, **options):
+        bits = options["bits"]
+        print("Generating {} bits key".format(bits))
+        crypt = MixCrypt(bits=bits)
+        k = crypt.k
+
+        t = self.measure(fixed_base, int(k.g), int(k.p))
+        t += self.measure(fixed_base, int(k.y), int(k.p))
+        print("Fixed-base tables built in {:.3f}s".format(t))
+
+        for n in options["votes"]:
+            ciphers = [crypt.encrypt(1)] * n
+            t1 = self.measure(self.reencrypt_pow, k, ciphers)
+            t2 = self.measure(self.reencrypt_fixed_base, crypt, ciphers)
+            t3 = self.measure(self.reencrypt_batch, crypt, ciphers, options["workers"])
+            print(
+                " * {} reencryptions: pow {:.3f}s / fixed-base {:.3f}s ({:.2f}x)"
+                " / batch {:.3f}s ({:.2f}x, {} workers)".format(
+                    n, t1, t2, t1 / t2, t3, t1 / t3, options["workers"]
+                )
+            )
+
+            ciphers = [crypt.encrypt(2)] * n
+            t1 = self.measure(self.decrypt_loop, k, ciphers)
+            t2 = self.measure(self.decrypt_batch, k, ciphers)
+            print(
+                " * {} decryptions: _decrypt loop {:.3f}s / batch {:.3f}s "
+                "({:.2f}x)".format(n, t1, t2, t1 / t2)
+            )
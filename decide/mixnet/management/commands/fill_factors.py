@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from base import mods
+from mixnet.models import FactorPool
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the pool of reencryption factors of a voting while it's open, "
+        "up to the given depth, so the shuffle of the tally only multiplies. "
+        "It can be run again as the votes arrive."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("voting", type=int)
+        parser.add_argument(
+            "--depth", type=int, default=10000, help="factors in the pool"
+        )
+        parser.add_argument("--batch", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        vid = options["voting"]
+        votings = mods.get("voting", params={"id": vid})
+        if not votings or not votings[0].get("pub_key"):
+            raise CommandError("The voting {} hasn't a public key".format(vid))
+
+        pk = votings[0]["pub_key"]
+        pool = FactorPool.get(vid, (pk["p"], pk["g"], pk["y"]), create=True)
+        n = options["depth"] - pool.factors.count()
+        if n > 0:
+            t = time.perf_counter()
+            pool.fill(n, options["batch"])
+            print("{} factors computed in {:.2f}s".format(n, time.perf_counter() - t))
+        print("{} factors in the pool of voting {}".format(pool.factors.count(), vid))
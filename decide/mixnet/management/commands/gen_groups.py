@@ -0,0 +1,48 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from mixnet import groups
+from mixnet.models import Group
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates safe-prime groups offline and keeps them for the keys of "
+        "the next votings. Only needed for the key sizes without a RFC "
+        "group, the groups are generated at voting start if there isn't "
+        "any."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bits", type=int, default=settings.KEYBITS)
+        parser.add_argument("--count", type=int, default=1)
+        parser.add_argument(
+            "--workers", type=int, default=1, help="processes generating groups"
+        )
+
+    def handle(self, *args, **options):
+        bits = options["bits"]
+        if groups.rfc_group(bits):
+            name = groups.BY_BITS[bits]
+            print("The {} bits keys use the {} group".format(bits, name))
+            return
+
+        t = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            futures = [
+                executor.submit(groups.generate, bits) for i in range(options["count"])
+            ]
+            for f in futures:
+                p, g = f.result()
+                Group.objects.create(bits=bits, p=p, g=g)
+                print(
+                    " * {} bits group generated in {:.1f}s".format(
+                        bits, time.perf_counter() - t
+                    )
+                )
+
+        total = Group.objects.filter(bits=bits).count()
+        print("{} groups of {} bits".format(total, bits))
@@ -0,0 +1,19 @@
+# Generated by Django 4.1 on 2026-10-18 08:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mixnet", "0004_auto_20180605_0842"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="mixnet",
+            index=models.Index(
+                fields=["voting_id", "auth_position"], name="mixnet_voting_auth_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.1 on 2026-10-18 09:06
+
+import base.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mixnet", "0005_mixnet_mixnet_voting_auth_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Group",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bits", models.PositiveIntegerField(db_index=True)),
+                ("p", base.models.BigBinField(editable=True)),
+                ("g", base.models.BigBinField(editable=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.1 on 2026-10-18 09:15
+
+import base.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0004_key_binary"),
+        ("mixnet", "0006_group"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FactorPool",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("voting_id", models.PositiveIntegerField(db_index=True)),
+                (
+                    "key",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="factor_pools",
+                        to="base.key",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Factor",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("a", base.models.BigBinField(editable=True)),
+                ("b", base.models.BigBinField(editable=True)),
+                (
+                    "pool",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="factors",
+                        to="mixnet.factorpool",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -34,20 +34,249 @@ True
 """
 
 
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from math import isqrt
+
 from Crypto.PublicKey import ElGamal
 from Crypto.Random import random
 from Crypto import Random
-from Crypto.Util.number import GCD
+from Crypto.Util.number import GCD, isPrime
+
+from . import arith
+from .randpool import pool
+
+
+# number of fixed-base tables kept in memory, one per (base, modulus) pair
+FIXED_BASE_CACHE = 16
+
+# public key without the ElGamal object, enough to encrypt and reencrypt
+PublicKey = namedtuple("PublicKey", ("p", "g", "y"))
+
+
+@lru_cache(maxsize=FIXED_BASE_CACHE)
+def subgroup_order(p, g):
+    """
+    Returns q if p = 2q + 1 is a safe prime and g generates the subgroup of
+    order q, like the keys created by ElGamal.generate, else None
+    """
 
+    q = (p - 1) // 2
+    if isPrime(q) and arith.powmod(g, q, p) == 1:
+        return q
+    return None
+
+
+def rand(p, g=None):
+    """
+    Random exponent for the group p. If g generates a safe-prime subgroup
+    any exponent in [1, q - 1] is valid, so we don't need to look for one
+    coprime with p - 1.
+    """
+
+    p = int(p)
+    q = subgroup_order(p, int(g)) if g else None
+    if q:
+        return pool.randint(1, q - 1)
 
-def rand(p):
     while True:
-        k = random.StrongRandom().randint(1, int(p) - 1)
-        if GCD(k, int(p) - 1) == 1:
+        k = pool.randint(1, p - 1)
+        if GCD(k, p - 1) == 1:
             break
     return k
 
 
+def rands(p, n, g=None):
+    """
+    Draws n random exponents for the group p in one go
+    """
+
+    p = int(p)
+    q = subgroup_order(p, int(g)) if g else None
+    if q:
+        return pool.randints(1, q - 1, n)
+
+    ks = []
+    while len(ks) < n:
+        ks += [k for k in pool.randints(1, p - 1, n - len(ks)) if GCD(k, p - 1) == 1]
+    return ks
+
+
+_pools = {}
+
+
+def get_pool(workers):
+    """
+    Returns the process pool for this number of workers, it's created the
+    first time and reused by the next calls in this process.
+
+    The workers are started with forkserver, or spawn where it isn't
+    available, never with fork: this process has other threads (tally
+    jobs, pipeline, server threads) and a forked worker could get a copy
+    of a lock they hold. The workers only import this module and use the
+    same arith backend.
+    """
+
+    if workers not in _pools:
+        methods = multiprocessing.get_all_start_methods()
+        method = "forkserver" if "forkserver" in methods else "spawn"
+        _pools[workers] = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context(method),
+            initializer=arith.use,
+            initargs=(arith.backend().name,),
+        )
+    return _pools[workers]
+
+
+def split(msgs, n):
+    """
+    Splits msgs in n consecutive chunks with almost the same size
+
+    >>> split([1, 2, 3, 4, 5], 2)
+    [[1, 2, 3], [4, 5]]
+    """
+
+    size, extra = divmod(len(msgs), n)
+    chunks = []
+    start = 0
+    for i in range(n):
+        end = start + size + (1 if i < extra else 0)
+        chunks.append(msgs[start:end])
+        start = end
+    return chunks
+
+
+def gen_factors(n, p, g, y):
+    """
+    n reencryption factors (g^r, y^r) with random r. They don't depend on
+    the ciphers, so they can be computed before the tally.
+    """
+
+    fg = fixed_base(g, p)
+    fy = fixed_base(y, p)
+    return [(fg.pow(r), fy.pow(r)) for r in rands(p, n, g)]
+
+
+def factors_chunk(indexes, p, g, y):
+    """
+    gen_factors for the workers of the process pool, one for each index
+    """
+
+    return gen_factors(len(indexes), p, g, y)
+
+
+def apply_factors(ciphers, factors, p):
+    """
+    Reencrypts each cipher with its factor, only two multiplications
+    """
+
+    p = int(p)
+    msgs = []
+    for (a, b), (fa, fb) in zip(ciphers, factors):
+        msgs.append(((int(a) * int(fa)) % p, (int(b) * int(fb)) % p))
+    return msgs
+
+
+def reencrypt_chunk(ciphers, p, g, y):
+    """
+    Reencrypts a list of ciphers keeping the order, used by the workers of
+    the process pool, so it only receives and returns plain ints
+    """
+
+    return apply_factors(ciphers, gen_factors(len(ciphers), p, g, y), p)
+
+
+def batch_inverse(values, p):
+    """
+    Inverses of all the values mod p with only one modular inverse
+    (Montgomery's trick): the product of all the values is inverted and
+    each inverse is taken out of it, with three multiplications per value.
+
+    >>> batch_inverse([2, 3, 5], 7)
+    [4, 5, 3]
+    """
+
+    p = int(p)
+    prefix = []
+    acc = 1
+    for v in values:
+        acc = (acc * v) % p
+        prefix.append(acc)
+    if not prefix:
+        return []
+
+    inv = arith.invert(acc, p)
+    inverses = [0] * len(values)
+    for i in range(len(values) - 1, 0, -1):
+        inverses[i] = (inv * prefix[i - 1]) % p
+        inv = (inv * values[i]) % p
+    inverses[0] = inv
+    return inverses
+
+
+def decrypt_batch(ciphers, p, g, x, last=True):
+    """
+    Decrypts a list of ciphers keeping the order, b / a^x for each one,
+    with only one modular inverse for the whole list. Like
+    ElGamal._decrypt the a are blinded, with one random g^r for the whole
+    list: (a g^r)^x = a^x y^r, and y^r is taken out with the inverse.
+
+    The ciphers without 0 < a < p can't be decrypted, if there is any the
+    whole batch raises ValueError, so the tally never has fewer msgs than
+    votes.
+
+    With last=False the partial decryptions (a, b / a^x) are returned,
+    for the next auth.
+    """
+
+    p, g, x = int(p), int(g), int(x)
+    ciphers = [(int(a), int(b)) for a, b in ciphers]
+    invalid = sum(1 for a, b in ciphers if not 0 < a < p)
+    if invalid:
+        raise ValueError("Invalid ciphertext: {} of {}".format(invalid, len(ciphers)))
+    if not ciphers:
+        return []
+
+    blind = arith.powmod(g, pool.randint(2, p - 2), p)
+    unblind = arith.powmod(blind, x, p)
+    shared = batch_inverse([arith.powmod((a * blind) % p, x, p) for a, b in ciphers], p)
+
+    msgs = []
+    for (a, b), s in zip(ciphers, shared):
+        clear = (b * s * unblind) % p
+        msgs.append(clear if last else (a, clear))
+    return msgs
+
+
+def decrypt_chunk(ciphers, p, g, y, x, last=True):
+    """
+    Decrypts a list of ciphers keeping the order, used by the workers of
+    the process pool
+    """
+
+    return decrypt_batch(ciphers, p, g, x, last)
+
+
+def parallel_map(fn, msgs, workers, *args):
+    """
+    Splits msgs between the workers of the process pool, calls
+    fn(chunk, *args) in each worker and joins the results in order
+    """
+
+    if workers <= 1 or len(msgs) <= workers:
+        return fn(msgs, *args)
+
+    pool = get_pool(workers)
+    futures = [pool.submit(fn, chunk, *args) for chunk in split(msgs, workers)]
+    result = []
+    for f in futures:
+        result.extend(f.result())
+    return result
+
+
 def gen_multiple_key(*crypts):
     k1 = crypts[0]
     k = MixCrypt(k=k1.k, bits=k1.bits)
@@ -103,21 +332,148 @@ def multiple_decrypt_shuffle2(ciphers, *crypts, pubkey=None):
     return b
 
 
+def add_ciphers(c1, c2, p, sub=False):
+    """
+    Sums two lists of exponential ElGamal ciphers, (g^r, g^m * y^r), one to
+    one: the product of two ciphers encrypts the sum of their exponents,
+    and with sub the product by the inverse of c2 the difference.
+
+    >>> k = MixCrypt(bits=256)
+    >>> p, g = int(k.k.p), int(k.k.g)
+    >>> c1 = [k.encrypt(pow(g, 2, p))]
+    >>> c2 = [k.encrypt(pow(g, 3, p))]
+    >>> k.decrypt(add_ciphers(c1, c2, p)[0]) == pow(g, 5, p)
+    True
+    >>> k.decrypt(add_ciphers(add_ciphers(c1, c2, p), c1, p, True)[0]) == pow(g, 3, p)
+    True
+    """
+
+    p = int(p)
+    result = []
+    for (a1, b1), (a2, b2) in zip(c1, c2):
+        a2, b2 = int(a2), int(b2)
+        if sub:
+            a2, b2 = arith.invert(a2, p), arith.invert(b2, p)
+        result.append([(int(a1) * a2) % p, (int(b1) * b2) % p])
+    return result
+
+
+def small_dlog(h, g, p, bound):
+    """
+    Returns the x in [0, bound] with g^x = h mod p, or None. It's the last
+    step to decrypt an exponential ElGamal cipher, where x is a count of
+    votes, using baby-step giant-step in about sqrt(bound) steps.
+
+    >>> small_dlog(pow(3, 1234, 1000003), 3, 1000003, 5000)
+    1234
+    >>> small_dlog(1, 3, 1000003, 10)
+    0
+    >>> small_dlog(pow(3, 11, 1000003), 3, 1000003, 10) is None
+    True
+    """
+
+    h, g, p = int(h), int(g), int(p)
+    m = isqrt(bound) + 1
+    baby = {}
+    e = 1
+    for j in range(m):
+        baby.setdefault(e, j)
+        e = (e * g) % p
+
+    giant = arith.invert(arith.powmod(g, m, p), p)
+    for i in range(m):
+        j = baby.get(h)
+        if j is not None and i * m + j <= bound:
+            return i * m + j
+        h = (h * giant) % p
+    return None
+
+
+class FixedBase:
+    """
+    Fixed-base modular exponentiation using a precomputed window table.
+
+    The exponent is split in windows of w bits and the table stores
+    base^(d * 2^(w*i)) for every window i and digit d, so an
+    exponentiation is just one modular multiplication per window. The
+    table is kept in the numbers of the arith backend.
+
+    >>> fb = FixedBase(156, 167)
+    >>> [fb.pow(e) for e in (0, 1, 2, 89, 165)] == [pow(156, e, 167) for e in (0, 1, 2, 89, 165)]
+    True
+    """
+
+    def __init__(self, base, mod, window=None):
+        self.base = int(base)
+        self.mod = int(mod)
+        bits = self.mod.bit_length()
+        if not window:
+            window = 4 if bits <= 512 else 5 if bits <= 1024 else 6
+        self.window = window
+        self.mask = (1 << window) - 1
+
+        # the modulus in the numbers of the backend
+        self.nmod = mod = arith.number(self.mod)
+        self.table = []
+        b = arith.number(self.base % self.mod)
+        for i in range(0, bits, window):
+            row = [arith.number(1)]
+            for d in range(self.mask):
+                row.append((row[-1] * b) % mod)
+            self.table.append(row)
+            b = (row[-1] * b) % mod
+
+    def pow(self, e):
+        e = int(e)
+        if e.bit_length() > len(self.table) * self.window:
+            return arith.powmod(self.base, e, self.mod)
+
+        r = self.table[0][0]
+        mod = self.nmod
+        mask = self.mask
+        window = self.window
+        for row in self.table:
+            if not e:
+                break
+            d = e & mask
+            if d:
+                r = (r * row[d]) % mod
+            e >>= window
+        return int(r)
+
+
+def fixed_base(base, mod):
+    """
+    Returns the cached FixedBase table for this base and modulus, building
+    it the first time, so the table is computed once per public key and
+    arith backend.
+    """
+
+    return cached_fixed_base(base, mod, arith.backend().name)
+
+
+@lru_cache(maxsize=FIXED_BASE_CACHE)
+def cached_fixed_base(base, mod, backend):
+    return FixedBase(base, mod)
+
+
 class MixCrypt:
-    def __init__(self, k=None, bits=256):
+    def __init__(self, k=None, bits=256, generate=True):
         self.bits = bits
         if k:
             self.k = self.getk(k.p, k.g)
-        else:
+        elif generate:
             self.k = self.genk()
+        else:
+            self.k = None
 
     def genk(self):
         self.k = ElGamal.generate(self.bits, Random.new().read)
         return self.k
 
     def getk(self, p, g):
-        x = rand(p)
-        y = pow(g, x, p)
+        x = rand(p, g)
+        y = arith.powmod(g, x, p)
         self.k = ElGamal.construct((p, g, y, x))
         return self.k
 
@@ -126,41 +482,32 @@ class MixCrypt:
         return self.k
 
     def encrypt(self, m, k=None):
-        r = rand(self.k.p)
         if not k:
             k = self.k
-        a, b = k._encrypt(m, r)
+        p, g, y = int(k.p), int(k.g), int(k.y)
+        r = rand(p, g)
+        a = fixed_base(g, p).pow(r)
+        b = fixed_base(y, p).pow(r)
+        if m != 1:
+            b = (b * int(m)) % p
         return a, b
 
     def decrypt(self, c):
-        m = self.k._decrypt(c)
-        return m
+        return decrypt_batch([c], self.k.p, self.k.g, self.k.x)[0]
 
     def multiple_decrypt(self, msgs, last=True):
-        msgs2 = []
-        for a, b in msgs:
-            clear = self.decrypt((a, b))
-            if last:
-                msg = clear
-            else:
-                msg = (a, clear)
-            msgs2.append(msg)
-        return msgs2
-
-    def shuffle_decrypt(self, msgs, last=True):
-        msgs2 = msgs.copy()
-        msgs3 = []
-        while msgs2:
-            n = random.StrongRandom().randint(0, len(msgs2) - 1)
-            a, b = msgs2.pop(n)
-            clear = self.decrypt((a, b))
-            if last:
-                msg = clear
-            else:
-                msg = (a, clear)
-            msgs3.append(msg)
-
-        return msgs3
+        return decrypt_batch(msgs, self.k.p, self.k.g, self.k.x, last)
+
+    def shuffle_decrypt(self, msgs, last=True, workers=1):
+        # the permutation is always done here, the workers only decrypt
+        perm = self.gen_perm(len(msgs))
+        msgs2 = [msgs[i] for i in perm]
+
+        if workers > 1:
+            k = tuple(int(i) for i in (self.k.p, self.k.g, self.k.y, self.k.x))
+            return parallel_map(decrypt_chunk, msgs2, workers, *k, last)
+
+        return self.multiple_decrypt(msgs2, last)
 
     def reencrypt(self, cipher, pubkey=None):
         """
@@ -178,8 +525,7 @@ class MixCrypt:
         """
 
         if pubkey:
-            p, g, y = pubkey
-            k = ElGamal.construct((p, g, y))
+            k = PublicKey(*map(int, pubkey))
         else:
             k = self.k
 
@@ -190,27 +536,57 @@ class MixCrypt:
         return ((a * a1) % p, (b * b1) % p)
 
     def gen_perm(self, l):
-        x = list(range(l))
-        for i in range(l):
-            d = random.StrongRandom().randint(0, i)
-            if i != d:
-                x[i] = x[d]
-                x[d] = i
-        return x
-
-    def shuffle(self, msgs, pubkey=None):
         """
-        Reencrypt and shuffle
+        Random permutation of range(l) in linear time, using the inside-out
+        Fisher-Yates shuffle with a cryptographically secure random source
         """
 
-        msgs2 = msgs.copy()
-        perm = self.gen_perm(len(msgs))
-        for i, p in enumerate(perm):
-            m = msgs[p]
-            nm = self.reencrypt(m, pubkey)
-            msgs2[i] = nm
+        return pool.permutation(l)
+
+    def reencrypt_batch(self, ciphers, pubkey=None, workers=1, factors=()):
+        """
+        Reencrypt and shuffle a list of ciphers in one pass, building the
+        public key and drawing the randomness only once for the whole list.
+
+        With more than one worker the reencryption is split in a process
+        pool, but the permutation is always generated in this process.
+
+        The factors, (g^r, y^r) pairs computed before, are used for the
+        first ciphers, each one only once, and the rest get new factors.
+
+        >>> B = 256
+        >>> k = MixCrypt(bits=B)
+        >>> pk = (k.k.p, k.k.g, k.k.y)
+        >>> clears = [random.StrongRandom().randint(1, B) for i in range(5)]
+        >>> cipher = [k.encrypt(i) for i in clears]
+        >>> cipher2 = k.reencrypt_batch(cipher, pk)
+        >>> d2 = [k.decrypt(i) for i in cipher2]
+        >>> sorted(clears) == sorted(d2)
+        True
+        >>> set(cipher) & set(cipher2)
+        set()
+        """
+
+        if pubkey:
+            k = PublicKey(*map(int, pubkey))
+        else:
+            k = self.k
+
+        p, g, y = int(k.p), int(k.g), int(k.y)
+        perm = self.gen_perm(len(ciphers))
+        msgs = [ciphers[i] for i in perm]
+
+        factors = factors[: len(msgs)]
+        done = apply_factors(msgs, factors, p)
+        rest = msgs[len(factors) :]
+        return done + parallel_map(reencrypt_chunk, rest, workers, p, g, y)
+
+    def shuffle(self, msgs, pubkey=None, workers=1, factors=()):
+        """
+        Reencrypt and shuffle
+        """
 
-        return msgs2
+        return self.reencrypt_batch(msgs, pubkey, workers, factors)
 
 
 if __name__ == "__main__":
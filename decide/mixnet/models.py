@@ -1,15 +1,54 @@
-from django.db import models
+from functools import cached_property
 
-from .mixcrypt import MixCrypt
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
-from base import mods
-from base.models import Auth, Key
+from . import codec, groups, keys
+from .mixcrypt import MixCrypt, fixed_base, gen_factors
+
+from base.models import Auth, BigBinField, Key
 from base.serializers import AuthSerializer
 from django.conf import settings
 
 
 # number of bits for the key, all auths should use the same number of bits
 B = settings.KEYBITS
+# number of processes used to shuffle and decrypt, 1 means no process pool
+WORKERS = settings.MIXNET_WORKERS
+# ids deleted in each query when the factors are used
+FACTORS_DELETE_BATCH = 500
+
+
+class Group(models.Model):
+    """
+    Safe-prime group generated for a key size without a RFC group
+    """
+
+    bits = models.PositiveIntegerField(db_index=True)
+    p = BigBinField()
+    g = BigBinField()
+
+    def __str__(self):
+        return "{} bits group".format(self.bits)
+
+    @classmethod
+    def get(cls, bits):
+        """
+        (p, g) for a new key of bits: the RFC group, if not one of the
+        generated groups, and if there isn't any a new one is generated
+        and kept for the next keys
+        """
+
+        group = groups.rfc_group(bits)
+        if group:
+            return group
+
+        group = cls.objects.filter(bits=bits).order_by("?").first()
+        if not group:
+            p, g = groups.generate(bits)
+            group = cls.objects.create(bits=bits, p=p, g=g)
+        return int(group.p), int(group.g)
 
 
 class Mixnet(models.Model):
@@ -27,40 +66,64 @@ class Mixnet(models.Model):
         on_delete=models.SET_NULL,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["voting_id", "auth_position"], name="mixnet_voting_auth_idx"
+            ),
+        ]
+
     def __str__(self):
         auths = ", ".join(a.name for a in self.auths.all())
         return "Voting: {}, Auths: {}\nPubKey: {}".format(
             self.voting_id, auths, self.pubkey
         )
 
-    def shuffle(self, msgs, pk):
-        crypt = MixCrypt(bits=B)
-        k = crypt.setk(self.key.p, self.key.g, self.key.y, self.key.x)
+    @cached_property
+    def crypt(self):
+        """
+        MixCrypt with the key of this auth, built once for each instance
+        (see mixnet.keys), with the fixed-base tables of the key
+        """
 
-        return crypt.shuffle(msgs, pk)
+        k = self.key
+        crypt = MixCrypt(bits=B, generate=False)
+        crypt.setk(k.p, k.g, k.y, k.x)
+        fixed_base(k.g, k.p)
+        fixed_base(k.y, k.p)
+        return crypt
 
-    def decrypt(self, msgs, pk, last=False):
-        crypt = MixCrypt(bits=B)
-        k = crypt.setk(self.key.p, self.key.g, self.key.y, self.key.x)
-        return crypt.shuffle_decrypt(msgs, last)
+    def shuffle(self, msgs, pk):
+        if not pk:
+            pk = (self.key.p, self.key.g, self.key.y)
+        factors = FactorPool.take(self.voting_id, pk, len(msgs))
+        return self.crypt.shuffle(msgs, pk, WORKERS, factors)
+
+    def decrypt(self, msgs, pk, last=False, shuffle=True):
+        crypt = self.crypt
+        if not shuffle:
+            # the sums of a running tally, in the order of the options
+            return crypt.multiple_decrypt(msgs, last)
+        return crypt.shuffle_decrypt(msgs, last, WORKERS)
 
     def gen_key(self, p=0, g=0):
-        crypt = MixCrypt(bits=B)
+        """
+        The key of this auth, in the group p, g of the first auth. The first
+        auth takes a stored group, so only the private exponent is drawn.
+        """
+
+        crypt = MixCrypt(bits=B, generate=False)
         if self.key:
             k = crypt.setk(self.key.p, self.key.g, self.key.y, self.key.x)
-        elif not g or not p:
-            k = crypt.genk()
-            key = Key(p=int(k.p), g=int(k.g), y=int(k.y), x=int(k.x))
-            key.save()
-
-            self.key = key
-            self.save()
         else:
+            if not g or not p:
+                p, g = Group.get(B)
             k = crypt.getk(p, g)
             key = Key(p=int(k.p), g=int(k.g), y=int(k.y), x=int(k.x))
             key.save()
 
             self.key = key
+            self.__dict__.pop("crypt", None)
             self.save()
 
     def chain_call(self, path, data):
@@ -76,8 +139,7 @@ class Mixnet(models.Model):
 
         if next_auths:
             auth = next_auths.first().url
-            r = mods.post("mixnet", entry_point=path, baseurl=auth, json=data)
-            return r
+            return codec.post(path, auth, data)
 
         return None
 
@@ -88,3 +150,82 @@ class Mixnet(models.Model):
             next_auths = next_auths[1:]
 
         return next_auths
+
+
+class FactorPool(models.Model):
+    """
+    Reencryption factors (g^r, y^r) of a voting public key, computed while
+    the voting is open with the fill_factors command, so the shuffle is
+    mostly multiplications. The factors link the shuffled votes with the
+    original ones, so they must be kept as safe as the private key, and
+    each one is deleted when it's used.
+    """
+
+    voting_id = models.PositiveIntegerField(db_index=True)
+    key = models.ForeignKey(Key, related_name="factor_pools", on_delete=models.CASCADE)
+
+    def __str__(self):
+        return "Voting: {}, {} factors".format(self.voting_id, self.factors.count())
+
+    @classmethod
+    def get(cls, voting_id, pk, create=False):
+        p, g, y = (int(i) for i in pk)
+        for pool in cls.objects.filter(voting_id=voting_id).select_related("key"):
+            if (pool.key.p, pool.key.g, pool.key.y) == (p, g, y):
+                return pool
+        if create:
+            key = Key.objects.create(p=p, g=g, y=y)
+            return cls.objects.create(voting_id=voting_id, key=key)
+        return None
+
+    @classmethod
+    def take(cls, voting_id, pk, n):
+        """
+        Removes and returns up to n factors of the pool of the voting with
+        the key pk, if there is one
+        """
+
+        pool = cls.get(voting_id, pk)
+        if not pool or not n:
+            return []
+
+        with transaction.atomic():
+            factors = list(
+                pool.factors.select_for_update(skip_locked=True).values_list(
+                    "id", "a", "b"
+                )[:n]
+            )
+            ids = [f[0] for f in factors]
+            for i in range(0, len(ids), FACTORS_DELETE_BATCH):
+                Factor.objects.filter(id__in=ids[i : i + FACTORS_DELETE_BATCH]).delete()
+        return [(a, b) for i, a, b in factors]
+
+    def fill(self, n, batch_size=1000):
+        """
+        Adds n new factors to the pool
+        """
+
+        k = self.key
+        for i in range(0, n, batch_size):
+            factors = gen_factors(min(batch_size, n - i), k.p, k.g, k.y)
+            Factor.objects.bulk_create(Factor(pool=self, a=a, b=b) for a, b in factors)
+
+
+class Factor(models.Model):
+    pool = models.ForeignKey(
+        FactorPool, related_name="factors", on_delete=models.CASCADE
+    )
+    a = BigBinField()
+    b = BigBinField()
+
+
+@receiver(post_save, sender=Mixnet)
+@receiver(post_delete, sender=Mixnet)
+def invalidate_mixnet(sender, instance, **kwargs):
+    keys.invalidate(instance.voting_id, instance.auth_position)
+
+
+@receiver(post_save, sender=Key)
+@receiver(post_delete, sender=Key)
+def invalidate_key(sender, instance, **kwargs):
+    keys.invalidate(key_id=instance.pk)
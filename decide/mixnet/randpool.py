@@ -0,0 +1,103 @@
+"""
+Buffered secure random source for the mixnet.
+
+Reading from the OS random source for every exponent or permutation index
+is slow when we have to shuffle thousands of votes, so this module reads
+the random bytes in big blocks and hands them out as integers.
+
+>>> pool = RandomPool()
+>>> all(1 <= pool.randint(1, 6) <= 6 for i in range(100))
+True
+>>> sorted(pool.permutation(10)) == list(range(10))
+True
+"""
+
+import os
+import threading
+
+from Crypto.Random import get_random_bytes
+
+
+# bytes read from the OS each time the buffer is empty
+BUFFER_SIZE = 64 * 1024
+
+
+class RandomPool:
+    def __init__(self, size=BUFFER_SIZE):
+        self.size = size
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.buf = b""
+        self.pos = 0
+        self.pid = os.getpid()
+
+    def read(self, n):
+        with self.lock:
+            # a forked process must never reuse the bytes of its parent
+            if self.pid != os.getpid():
+                self.reset()
+            if self.pos + n > len(self.buf):
+                self.buf = self.buf[self.pos :] + get_random_bytes(max(self.size, n))
+                self.pos = 0
+            data = self.buf[self.pos : self.pos + n]
+            self.pos += n
+        return data
+
+    def randbelow(self, n):
+        """
+        Uniform random integer in [0, n)
+        """
+
+        bits = n.bit_length()
+        nbytes = (bits + 7) // 8
+        excess = nbytes * 8 - bits
+        while True:
+            r = int.from_bytes(self.read(nbytes), "big") >> excess
+            if r < n:
+                return r
+
+    def randint(self, a, b):
+        """
+        Uniform random integer in [a, b]
+        """
+
+        return a + self.randbelow(b - a + 1)
+
+    def randints(self, a, b, n):
+        """
+        n uniform random integers in [a, b], the bytes for all of them are
+        read at once
+        """
+
+        size = b - a + 1
+        bits = size.bit_length()
+        nbytes = (bits + 7) // 8
+        excess = nbytes * 8 - bits
+
+        ints = []
+        while len(ints) < n:
+            missing = n - len(ints)
+            data = self.read(nbytes * missing)
+            for i in range(0, len(data), nbytes):
+                r = int.from_bytes(data[i : i + nbytes], "big") >> excess
+                if r < size:
+                    ints.append(a + r)
+        return ints
+
+    def permutation(self, n):
+        """
+        Random permutation of range(n), inside-out Fisher-Yates shuffle
+        """
+
+        x = list(range(n))
+        for i in range(n):
+            d = self.randbelow(i + 1)
+            if i != d:
+                x[i] = x[d]
+                x[d] = i
+        return x
+
+
+pool = RandomPool()
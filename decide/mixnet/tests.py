@@ -1,18 +1,224 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import time
+from unittest import mock, skipUnless
+
+from django.test import TestCase, override_settings
 from django.conf import settings
+from django.http import Http404
 from rest_framework.test import APIClient
 from rest_framework.test import APITestCase
 
 from mixnet.mixcrypt import MixCrypt
 from mixnet.mixcrypt import ElGamal
+from mixnet.mixcrypt import FixedBase, fixed_base, rand
+from mixnet.mixcrypt import batch_inverse, decrypt_batch, get_pool
+from mixnet.mixcrypt import random, rands, subgroup_order
+from mixnet import arith, codec, groups, keys
+from mixnet.models import FactorPool, Group, Mixnet
+from mixnet.randpool import RandomPool
 
 from base import mods
+from base.models import Key
+from base.tests import QueryPlanMixin
 
 
-class MixnetCase(APITestCase):
+class MixCryptCase(TestCase):
+    def setUp(self):
+        self.crypt = MixCrypt(bits=settings.KEYBITS)
+
+    def test_no_generate(self):
+        k = self.crypt.k
+        crypt = MixCrypt(bits=settings.KEYBITS, generate=False)
+        self.assertIsNone(crypt.k)
+        crypt.k = ElGamal.construct((k.p, k.g, k.y))
+        self.assertEqual(self.crypt.decrypt(crypt.encrypt(7)), 7)
+
+    def test_fixed_base(self):
+        p, g = int(self.crypt.k.p), int(self.crypt.k.g)
+        fb = FixedBase(g, p)
+        for i in range(20):
+            e = rand(p)
+            self.assertEqual(fb.pow(e), pow(g, e, p))
+        self.assertEqual(fb.pow(0), 1)
+        self.assertEqual(fb.pow(p * p), pow(g, p * p, p))
+
+    def test_random_pool(self):
+        pool = RandomPool(size=16)
+        ints = pool.randints(5, 9, 1000)
+        self.assertEqual(len(ints), 1000)
+        self.assertEqual(set(ints), {5, 6, 7, 8, 9})
+        self.assertEqual(sorted(pool.permutation(100)), list(range(100)))
+
+    def test_rand_subgroup(self):
+        p, g = int(self.crypt.k.p), int(self.crypt.k.g)
+        q = subgroup_order(p, g)
+        self.assertEqual(q, (p - 1) // 2)
+        for r in rands(p, 50, g) + [rand(p, g)]:
+            self.assertTrue(1 <= r < q)
+        for r in rands(p, 50):
+            self.assertTrue(1 <= r < p)
+
+    def test_fixed_base_cache(self):
+        p, y = int(self.crypt.k.p), int(self.crypt.k.y)
+        self.assertIs(fixed_base(y, p), fixed_base(y, p))
+
+    def test_encrypt_reencrypt(self):
+        clear = [2, 3, 4, 5]
+        cipher = [self.crypt.encrypt(m) for m in clear]
+        cipher2 = [self.crypt.reencrypt(c) for c in cipher]
+        self.assertNotEqual(cipher, cipher2)
+        self.assertEqual([self.crypt.decrypt(c) for c in cipher2], clear)
+
+    def test_reencrypt_batch(self):
+        k = self.crypt.k
+        clear = list(range(2, 20))
+        cipher = [self.crypt.encrypt(m) for m in clear]
+        shuffled = self.crypt.reencrypt_batch(cipher, (k.p, k.g, k.y))
+        self.assertEqual(len(shuffled), len(cipher))
+        self.assertFalse(set(cipher) & set(shuffled))
+        clear2 = [self.crypt.decrypt(c) for c in shuffled]
+        self.assertEqual(sorted(clear2), clear)
+
+    def test_decrypt_batch(self):
+        k = self.crypt.k
+        p, g, x = int(k.p), int(k.g), int(k.x)
+        cipher = [self.crypt.encrypt(m) for m in range(2, 30)]
+        clear = [int(k._decrypt(c)) for c in cipher]
+        self.assertEqual(decrypt_batch(cipher, p, g, x), clear)
+        partial = decrypt_batch(cipher, p, g, x, last=False)
+        self.assertEqual(partial, [(a, m) for (a, b), m in zip(cipher, clear)])
+        self.assertEqual(decrypt_batch([], p, g, x), [])
+
+        # one invalid cipher fails the whole batch
+        for invalid in [(0, 5), (p, 5), (-1, 5)]:
+            with self.assertRaises(ValueError):
+                decrypt_batch(cipher + [invalid], p, g, x)
+        with self.assertRaises(ValueError):
+            self.crypt.decrypt((0, 5))
+
+        values = [a for a, b in cipher]
+        for v, inv in zip(values, batch_inverse(values, p)):
+            self.assertEqual((v * inv) % p, 1)
+
+    def test_arith_backends(self):
+        k = self.crypt.k
+        p, g = int(k.p), int(k.g)
+        self.assertIn("python", arith.available())
+        self.assertIn("pycryptodome", arith.available())
+        self.assertEqual(arith.backend().name, arith.get_backend().name)
+        self.assertRaises(ValueError, arith.get_backend, "unknown")
+        try:
+            for name in arith.available():
+                self.assertEqual(arith.use(name).name, name)
+                self.assertEqual(arith.powmod(g, 12345, p), pow(g, 12345, p))
+                self.assertEqual(arith.invert(g, p), pow(g, -1, p))
+                self.assertEqual(fixed_base(g, p).pow(12345), pow(g, 12345, p))
+                cipher = self.crypt.reencrypt(self.crypt.encrypt(7), (p, g, k.y))
+                self.assertEqual(self.crypt.decrypt(cipher), 7)
+        finally:
+            arith.use(settings.MIXNET_BACKEND)
+
+    def test_arith_auto(self):
+        with mock.patch.object(arith, "available", return_value=["gmpy2"]):
+            self.assertEqual(arith.auto(), "gmpy2")
+        with mock.patch.object(arith, "available", return_value=[]):
+            with mock.patch.object(arith, "Integer", type("IntegerGMP", (), {})):
+                self.assertEqual(arith.auto(), "pycryptodome")
+            with mock.patch.object(arith, "Integer", type("IntegerNative", (), {})):
+                self.assertEqual(arith.auto(), "python")
+
+    def test_groups(self):
+        for name, (p, g) in groups.GROUPS.items():
+            self.assertEqual(p.bit_length(), int(name[-4:]))
+            self.assertEqual(pow(g, (p - 1) // 2, p), 1)
+        p, g = groups.rfc_group(2048)
+        self.assertEqual(subgroup_order(p, g), (p - 1) // 2)
+        self.assertIsNone(groups.rfc_group(256))
+
+    def test_gen_key_group(self):
+        with mock.patch("mixnet.models.B", 2048):
+            mn = Mixnet.objects.create(voting_id=1)
+            mn.gen_key()
+        self.assertEqual((mn.key.p, mn.key.g), groups.rfc_group(2048))
+        self.assertFalse(Group.objects.exists())
+
+        # the first key of a size without a RFC group generates the group
+        with mock.patch.object(groups, "generate", wraps=groups.generate) as gen:
+            keys = []
+            for i in range(2, 4):
+                mn = Mixnet.objects.create(voting_id=i)
+                mn.gen_key()
+                keys.append(mn.key)
+            gen.assert_called_once_with(settings.KEYBITS)
+        self.assertEqual(keys[0].p, keys[1].p)
+        self.assertNotEqual(keys[0].y, keys[1].y)
+
+    def test_parallel_shuffle_decrypt(self):
+        k = self.crypt.k
+        clear = list(range(2, 40))
+        cipher = [self.crypt.encrypt(m) for m in clear]
+        shuffled = self.crypt.reencrypt_batch(cipher, (k.p, k.g, k.y), workers=2)
+        self.assertEqual(len(shuffled), len(cipher))
+        self.assertFalse(set(cipher) & set(shuffled))
+
+        clear2 = self.crypt.shuffle_decrypt(shuffled, last=True, workers=2)
+        self.assertNotEqual(clear2, clear)
+        self.assertEqual(sorted(clear2), clear)
+
+        partial = self.crypt.shuffle_decrypt(shuffled, last=False, workers=2)
+        self.assertEqual(len(partial), len(clear))
+        self.assertEqual(sorted(b for a, b in partial), clear)
+
+        context = get_pool(2)._mp_context
+        self.assertNotEqual(context.get_start_method(), "fork")
+
+
+@skipUnless(os.environ.get("BENCHMARK"), "set BENCHMARK=1 to run the benchmarks")
+class ShuffleDecryptBenchmark(TestCase):
+    """
+    Compares the permutation used by shuffle_decrypt before and after
+    replacing the list.pop loop with gen_perm. Only the permutation is
+    measured, the decryption is the same in both versions.
+    """
+
+    SIZES = [10000, 100000, 1000000]
+
+    def perm_pop(self, msgs):
+        msgs2 = msgs.copy()
+        msgs3 = []
+        while msgs2:
+            n = random.StrongRandom().randint(0, len(msgs2) - 1)
+            msgs3.append(msgs2.pop(n))
+        return msgs3
+
+    def perm_gen(self, msgs):
+        perm = MixCrypt(generate=False).gen_perm(len(msgs))
+        return [msgs[i] for i in perm]
+
+    def test_benchmark_permutation(self):
+        for n in self.SIZES:
+            msgs = list(range(n))
+            t = time.perf_counter()
+            p1 = self.perm_pop(msgs)
+            t1 = time.perf_counter() - t
+            t = time.perf_counter()
+            p2 = self.perm_gen(msgs)
+            t2 = time.perf_counter() - t
+            self.assertEqual(sorted(p1), sorted(p2))
+            print(
+                "\n * {} ciphers: list.pop {:.3f}s / gen_perm {:.3f}s ({:.2f}x)".format(
+                    n, t1, t2, t1 / t2
+                )
+            )
+
+
+class MixnetCase(QueryPlanMixin, APITestCase):
     def setUp(self):
         self.client = APIClient()
         mods.mock_query(self.client)
+        keys.clear()
 
     def tearDown(self):
         self.client = None
@@ -94,6 +300,184 @@ class MixnetCase(APITestCase):
 
         self.assertEqual(sorted(clear), sorted(clear2))
 
+        data = {"msgs": shuffled + [[0, 5]]}
+        response = self.client.post("/mixnet/decrypt/1/", data, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_shuffle_factors(self):
+        self.test_create()
+
+        clear = list(range(2, 10))
+        pk = self.key["p"], self.key["g"], self.key["y"]
+        pool = FactorPool.get(1, pk, create=True)
+        pool.fill(5, batch_size=2)
+        self.assertEqual(FactorPool.get(1, pk), pool)
+
+        response = self.client.get("/mixnet/factors/1/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["factors"], 5)
+
+        data = {"msgs": self.encrypt_msgs(clear, pk)}
+        response = self.client.post("/mixnet/shuffle/1/", data, format="json")
+        self.assertEqual(response.status_code, 200)
+        shuffled = response.json()
+        self.assertFalse(set(map(tuple, shuffled)) & set(map(tuple, data["msgs"])))
+
+        response = self.client.get("/mixnet/factors/1/")
+        self.assertEqual(response.json()["factors"], 0)
+
+        data = {"msgs": shuffled}
+        response = self.client.post("/mixnet/decrypt/1/", data, format="json")
+        self.assertEqual(sorted(response.json()), clear)
+
+    def test_key_cache(self):
+        self.test_create()
+        mn = keys.get_mixnet(1, 0)
+        with self.assertNumQueries(1):
+            self.assertIs(keys.get_mixnet(1, 0), mn)
+            self.assertEqual(mn.crypt.k.x, mn.key.x)
+        self.assertRaises(Http404, keys.get_mixnet, 2, 0)
+
+        # changed in other process, without the signals
+        k = mn.key
+        key = Key.objects.create(p=k.p, g=k.g, y=k.y, x=k.x)
+        Mixnet.objects.filter(pk=mn.pk).update(key=key)
+        mn2 = keys.get_mixnet(1, 0)
+        self.assertIsNot(mn2, mn)
+        self.assertEqual(mn2.key_id, key.pk)
+        mn = mn2
+
+        # saving the key or the mixnet removes it from the cache
+        mn.key.save()
+        mn2 = keys.get_mixnet(1, 0)
+        self.assertIsNot(mn2, mn)
+        Mixnet.objects.get(pk=mn.pk).save()
+        self.assertIsNot(keys.get_mixnet(1, 0), mn2)
+
+        with override_settings(MIXNET_KEY_CACHE_SIZE=0):
+            keys.clear()
+            self.assertIsNot(keys.get_mixnet(1, 0), keys.get_mixnet(1, 0))
+
+    def test_decrypt_binary(self):
+        self.test_create()
+
+        clear = [2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14]
+        pk = self.key["p"], self.key["g"], self.key["y"]
+        encrypt = self.encrypt_msgs(clear, pk)
+
+        data = codec.dumps({"msgs": encrypt, "pk": self.key})
+        response = self.client.post(
+            "/mixnet/shuffle/1/",
+            data,
+            content_type=codec.MEDIA_TYPE,
+            HTTP_ACCEPT=codec.MEDIA_TYPE,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], codec.MEDIA_TYPE)
+        shuffled = codec.decode(response)
+        self.assertEqual(len(shuffled), len(encrypt))
+
+        # json response to a binary request
+        data = codec.dumps({"msgs": shuffled})
+        response = self.client.post(
+            "/mixnet/decrypt/1/", data, content_type=codec.MEDIA_TYPE
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(clear), sorted(response.json()))
+
+        response = self.client.post(
+            "/mixnet/decrypt/1/", b"\x00\x00\x00\xff{", content_type=codec.MEDIA_TYPE
+        )
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(MIXNET_FORMAT="json", MIXNET_UPLOAD_CHUNK_SIZE=100)
+    def test_decrypt_compressed(self):
+        self.test_create()
+
+        clear = [2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14]
+        pk = self.key["p"], self.key["g"], self.key["y"]
+        encrypt = self.encrypt_msgs(clear, pk)
+
+        # compressed request and response
+        data = codec.compress(json.dumps({"msgs": encrypt}).encode())
+        response = self.client.post(
+            "/mixnet/shuffle/1/",
+            data,
+            content_type="application/json",
+            HTTP_CONTENT_ENCODING="gzip",
+            HTTP_ACCEPT_ENCODING="gzip",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        shuffled = json.loads(gzip.decompress(response.content))
+        self.assertEqual(len(shuffled), len(encrypt))
+
+        # the same request, resolved in this process
+        headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+        response = mods.local_query("/mixnet/shuffle/1/", "post", headers, data=data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), len(encrypt))
+
+        # the requests to other servers are compressed and chunked
+        data = {"msgs": shuffled}
+        clear2 = codec.post("/decrypt/1/", "http://127.0.0.1:8000", data)
+        self.assertEqual(sorted(clear), sorted(clear2))
+
+        response = self.client.post(
+            "/mixnet/decrypt/1/",
+            b"not gzip",
+            content_type="application/json",
+            HTTP_CONTENT_ENCODING="gzip",
+        )
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(MIXNET_FORMAT="json")
+    def test_shuffle_big_body(self):
+        self.test_create()
+
+        clear = [2, 3, 4, 5]
+        pk = self.key["p"], self.key["g"], self.key["y"]
+        encrypt = self.encrypt_msgs(clear, pk)
+
+        # bigger than the 2.5MB of DATA_UPLOAD_MAX_MEMORY_SIZE
+        body = json.dumps({"msgs": encrypt}).encode() + b" " * (3 * 1024**2)
+        response = self.client.post(
+            "/mixnet/shuffle/1/", body, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), len(encrypt))
+
+        response = self.client.post(
+            "/mixnet/shuffle/1/",
+            codec.compress(body),
+            content_type="application/json",
+            HTTP_CONTENT_ENCODING="gzip",
+        )
+        self.assertEqual(response.status_code, 200)
+
+        with override_settings(MIXNET_MAX_BODY_SIZE=1024**2):
+            response = self.client.post(
+                "/mixnet/shuffle/1/", body, content_type="application/json"
+            )
+        self.assertEqual(response.status_code, 413)
+
+    def test_codec(self):
+        msgs = [[2**255 + 1, 3], [0, 2**256 - 1]]
+        data = {"msgs": msgs, "pk": {"p": 23, "g": 2, "y": 4}, "position": 1}
+        self.assertEqual(codec.loads(codec.dumps(data)), data)
+        self.assertEqual(codec.loads(codec.dumps([4, 5])), {"msgs": [4, 5]})
+        self.assertEqual(codec.loads(codec.dumps([])), {"msgs": []})
+        self.assertEqual(codec.loads(codec.dumps({"detail": "x"})), {"detail": "x"})
+
+        # json fallback, the mixnet creation doesn't accept the binary format
+        data = {
+            "msgs": [],
+            "voting": 1,
+            "auths": [{"name": "auth1", "url": "http://localhost:8000"}],
+        }
+        key = codec.post("/", "http://localhost:8000", data)
+        self.assertEqual(type(key["p"]), int)
+
     def test_multiple_auths(self):
         """
         This test emulates a two authorities shuffle and decryption.
@@ -153,6 +537,12 @@ class MixnetCase(APITestCase):
         self.assertNotEqual(clear, clear2)
         self.assertEqual(sorted(clear), sorted(clear2))
 
+    def test_mixnet_index(self):
+        Mixnet.objects.bulk_create(
+            [Mixnet(voting_id=i, auth_position=i % 3) for i in range(300)]
+        )
+        self.assertIndexScan(Mixnet.objects.filter(voting_id=1, auth_position=1))
+
     """def test_multiple_auths_mock(self):
 
         #This test emulates a two authorities shuffle and decryption.
@@ -1,11 +1,17 @@
 from django.conf import settings
-from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views.decorators.gzip import gzip_page
 from rest_framework import viewsets
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
+from . import keys
+from .codec import MixnetParser, MixnetRenderer
 from .serializers import MixnetSerializer
-from .models import Auth, Mixnet, Key
+from .models import Auth, FactorPool, Mixnet, Key
+from base.middleware import request_body
 from base.serializers import KeySerializer, AuthSerializer
 
 
@@ -65,17 +71,34 @@ class MixnetViewSet(viewsets.ModelViewSet):
         return Response(KeySerializer(pubkey, many=False).data)
 
 
-class Shuffle(APIView):
+class MixnetAPIView(APIView):
+    """
+    Views that read and write the msgs in json or in the binary format of
+    mixnet.codec. The requests can be chunked or compressed, and the
+    responses are compressed if the client accepts it.
+    """
+
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES + [MixnetParser]
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [MixnetRenderer]
+
+    @method_decorator(gzip_page)
+    @method_decorator(request_body)
+    def dispatch(self, request, *args, **kwargs):
+        return super().dispatch(request, *args, **kwargs)
+
+
+class Shuffle(MixnetAPIView):
     def post(self, request, voting_id):
         """
         * voting_id: id
         * msgs: [ [int, int] ]
         * pk: { "p": int, "g": int, "y": int } / nullable
         * position: int / nullable
+        * chain: bool / nullable, false to not call the next auth
         """
 
         position = request.data.get("position", 0)
-        mn = get_object_or_404(Mixnet, voting_id=voting_id, auth_position=position)
+        mn = keys.get_mixnet(voting_id, position)
 
         msgs = request.data.get("msgs", [])
         pk = request.data.get("pk", None)
@@ -90,25 +113,28 @@ class Shuffle(APIView):
             "msgs": msgs,
             "pk": {"p": p, "g": g, "y": y},
         }
-        # chained call to the next auth to gen the key
-        resp = mn.chain_call("/shuffle/{}/".format(voting_id), data)
-        if resp:
-            msgs = resp
+        # chained call to the next auth, unless the caller calls each auth
+        if request.data.get("chain", True):
+            resp = mn.chain_call("/shuffle/{}/".format(voting_id), data)
+            if resp:
+                msgs = resp
 
         return Response(msgs)
 
 
-class Decrypt(APIView):
+class Decrypt(MixnetAPIView):
     def post(self, request, voting_id):
         """
         * voting_id: id
         * msgs: [ [int, int] ]
         * pk: { "p": int, "g": int, "y": int } / nullable
         * position: int / nullable
+        * chain: bool / nullable, false to not call the next auth
+        * shuffle: bool / nullable, false to keep the order of the msgs
         """
 
         position = request.data.get("position", 0)
-        mn = get_object_or_404(Mixnet, voting_id=voting_id, auth_position=position)
+        mn = keys.get_mixnet(voting_id, position)
 
         msgs = request.data.get("msgs", [])
         pk = request.data.get("pk", None)
@@ -116,6 +142,7 @@ class Decrypt(APIView):
             p, g, y = pk["p"], pk["g"], pk["y"]
         else:
             p, g, y = mn.key.p, mn.key.g, mn.key.y
+        shuffle = request.data.get("shuffle", True)
 
         next_auths = mn.next_auths()
         last = next_auths.count() == 0
@@ -123,15 +150,41 @@ class Decrypt(APIView):
         # useful for tests only, to override the last value
         last = request.data.get("force-last", last)
 
-        msgs = mn.decrypt(msgs, (p, g, y), last=last)
+        try:
+            msgs = mn.decrypt(msgs, (p, g, y), last=last, shuffle=shuffle)
+        except ValueError as e:
+            raise ValidationError(str(e))
 
         data = {
             "msgs": msgs,
             "pk": {"p": p, "g": g, "y": y},
+            "shuffle": shuffle,
         }
-        # chained call to the next auth to gen the key
-        resp = mn.chain_call("/decrypt/{}/".format(voting_id), data)
-        if resp:
-            msgs = resp
+        # chained call to the next auth, unless the caller calls each auth
+        if request.data.get("chain", True):
+            resp = mn.chain_call("/decrypt/{}/".format(voting_id), data)
+            if resp:
+                msgs = resp
 
         return Response(msgs)
+
+
+class Factors(APIView):
+    def get(self, request, voting_id):
+        """
+        Number of reencryption factors computed for the voting:
+
+        * voting_id: id
+        * factors: int, total of all the pools
+        * pools: [ {"y": int, "factors": int} ], one for each public key
+        """
+
+        pools = FactorPool.objects.filter(voting_id=voting_id).select_related("key")
+        pools = [{"y": pool.key.y, "factors": pool.factors.count()} for pool in pools]
+        return Response(
+            {
+                "voting_id": voting_id,
+                "factors": sum(pool["factors"] for pool in pools),
+                "pools": pools,
+            }
+        )
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import Vote
+from .models import RunningTally, Vote
 
 
 admin.site.register(Vote)
+admin.site.register(RunningTally)
@@ -0,0 +1,39 @@
+# Generated by Django 4.1 on 2026-10-18 08:09
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def remove_duplicated_votes(apps, schema_editor):
+    """
+    Keeps only the last vote of each voter in each voting, so the unique
+    constraint can be added
+    """
+
+    Vote = apps.get_model("store", "Vote")
+    duplicated = (
+        Vote.objects.values("voting_id", "voter_id")
+        .annotate(n=Count("id"), last=Max("id"))
+        .filter(n__gt=1)
+    )
+    for vote in duplicated.iterator():
+        Vote.objects.filter(
+            voting_id=vote["voting_id"], voter_id=vote["voter_id"]
+        ).exclude(id=vote["last"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0003_auto_20180921_1522"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicated_votes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="vote",
+            constraint=models.UniqueConstraint(
+                fields=("voting_id", "voter_id"), name="store_vote_voting_voter_uniq"
+            ),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.1 on 2026-10-18 09:12
+
+import base.models
+from django.db import migrations
+
+
+FIELDS = ("a", "b")
+BATCH_SIZE = 1000
+
+
+def copy_fields(apps, src, dst):
+    Vote = apps.get_model("store", "Vote")
+    fields = [f + dst for f in FIELDS]
+    batch = []
+    for vote in Vote.objects.all().iterator(chunk_size=BATCH_SIZE):
+        for f in FIELDS:
+            setattr(vote, f + dst, getattr(vote, f + src))
+        batch.append(vote)
+        if len(batch) == BATCH_SIZE:
+            Vote.objects.bulk_update(batch, fields)
+            batch = []
+    Vote.objects.bulk_update(batch, fields)
+
+
+def to_binary(apps, schema_editor):
+    copy_fields(apps, "", "_bin")
+
+
+def to_text(apps, schema_editor):
+    copy_fields(apps, "_bin", "")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0004_key_binary"),
+        ("store", "0004_vote_store_vote_voting_voter_uniq"),
+    ]
+
+    operations = [
+        *[
+            migrations.AddField(
+                model_name="vote",
+                name=f + "_bin",
+                field=base.models.BigBinField(blank=True, null=True),
+            )
+            for f in FIELDS
+        ],
+        migrations.RunPython(to_binary, to_text),
+        *[migrations.RemoveField(model_name="vote", name=f) for f in FIELDS],
+        *[
+            migrations.RenameField(model_name="vote", old_name=f + "_bin", new_name=f)
+            for f in FIELDS
+        ],
+        *[
+            migrations.AlterField(
+                model_name="vote",
+                name=f,
+                field=base.models.BigBinField(),
+            )
+            for f in FIELDS
+        ],
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.1 on 2026-10-18 08:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0005_vote_binary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RunningTally",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("voting_id", models.PositiveIntegerField(unique=True)),
+                ("votes", models.PositiveIntegerField(default=0)),
+                ("options", models.JSONField(default=list)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="vote",
+            name="options",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -1,15 +1,40 @@
 from django.db import models
-from base.models import BigBigField
+from base.models import BigBinField
 
 
 class Vote(models.Model):
     voting_id = models.PositiveIntegerField()
     voter_id = models.PositiveIntegerField()
 
-    a = BigBigField()
-    b = BigBigField()
+    a = BigBinField()
+    b = BigBinField()
+
+    # [[a, b]] per option of a voting with a running tally
+    options = models.JSONField(blank=True, null=True)
 
     voted = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["voting_id", "voter_id"], name="store_vote_voting_voter_uniq"
+            ),
+        ]
+
     def __str__(self):
         return "{}: {}".format(self.voting_id, self.voter_id)
+
+
+class RunningTally(models.Model):
+    """
+    Sum of the ballots of a voting with a running tally: the product of the
+    exponential ElGamal ciphers of each option, in the order of the option
+    numbers, so each one encrypts g^count
+    """
+
+    voting_id = models.PositiveIntegerField(unique=True)
+    votes = models.PositiveIntegerField(default=0)
+    options = models.JSONField(default=list)
+
+    def __str__(self):
+        return "{}: {} votes".format(self.voting_id, self.votes)
@@ -1,19 +1,22 @@
 import datetime
 import random
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from rest_framework.test import APIClient
 from rest_framework.test import APITestCase
 
-from .models import Vote
+from .models import RunningTally, Vote
 from .serializers import VoteSerializer
 from base import mods
 from base.models import Auth
 from base.tests import BaseTestCase
 from census.models import Census
+from mixnet.mixcrypt import MixCrypt, small_dlog
 from mixnet.models import Key
-from voting.models import Question
+from voting.models import Question, QuestionOption
+from voting import cache as voting_cache
 from voting.models import Voting
 
 
@@ -93,6 +96,40 @@ class StoreTextCase(BaseTestCase):
         self.assertEqual(Vote.objects.first().a, CTE_A)
         self.assertEqual(Vote.objects.first().b, CTE_B)
 
+    def test_store_vote_invalid_cipher(self):
+        Census(voting_id=5001, voter_id=1).save()
+        user = self.get_or_create_user(1)
+        self.login(user=user.username)
+        key = Key(p=167, g=156, y=89)
+        key.save()
+        self.voting.pub_key = key
+        self.voting.save()
+
+        votes = [
+            {"a": -1, "b": 5},
+            {"a": "x", "b": 5},
+            {"a": 0, "b": 5},
+            {"a": 167, "b": 5},
+            {"a": 5, "b": 200},
+            {"a": 5},
+            "vote",
+        ]
+        for vote in votes:
+            data = {"voting": 5001, "voter": 1, "vote": vote}
+            response = self.client.post("/store/", data, format="json")
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(Vote.objects.count(), 0)
+
+    def test_store_vote_invalid_voting(self):
+        Census(voting_id=5001, voter_id=1).save()
+        user = self.get_or_create_user(1)
+        self.login(user=user.username)
+        for voting in ["abc", "5001x", [5001]]:
+            data = {"voting": voting, "voter": 1, "vote": {"a": 5, "b": 5}}
+            response = self.client.post("/store/", data, format="json")
+            self.assertEqual(response.status_code, 401)
+        self.assertEqual(Vote.objects.count(), 0)
+
     def test_vote(self):
         self.gen_votes()
         response = self.client.get("/store/", format="json")
@@ -135,6 +172,37 @@ class StoreTextCase(BaseTestCase):
 
         self.assertEqual(len(votes), Vote.objects.filter(voter_id=v).count())
 
+    def test_filter_pages(self):
+        votings, voters = self.gen_votes()
+        self.login()
+
+        votes = []
+        after = 0
+        while True:
+            url = "/store/?after={}&limit=3".format(after)
+            response = self.client.get(url, format="json")
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            self.assertTrue(len(page) <= 3)
+            if not page:
+                break
+            votes += page
+            after = page[-1]["id"]
+
+        self.assertEqual(len(votes), Vote.objects.count())
+        self.assertEqual([v["id"] for v in votes], sorted(v["id"] for v in votes))
+
+    def test_filter_pages_invalid(self):
+        self.gen_votes()
+        self.login()
+        for params in ("after=x", "limit=x", "limit=0", "limit=-3", "after=1.5"):
+            response = self.client.get("/store/?" + params, format="json")
+            self.assertEqual(response.status_code, 400)
+
+        with override_settings(STORE_MAX_LIMIT=5):
+            response = self.client.get("/store/?limit=100", format="json")
+        self.assertEqual(len(response.json()), 5)
+
     def test_hasvote(self):
         votings, voters = self.gen_votes()
         vo = Vote.objects.first()
@@ -188,3 +256,125 @@ class StoreTextCase(BaseTestCase):
         self.voting.save()
         response = self.client.post("/store/", data, format="json")
         self.assertEqual(response.status_code, 401)
+
+    def test_store_revote(self):
+        data = {"voting": 5001, "voter": 1, "vote": {"a": 30, "b": 55}}
+        Census(voting_id=5001, voter_id=1).save()
+        user = self.get_or_create_user(1)
+        self.login(user=user.username)
+        response = self.client.post("/store/", data, format="json")
+        self.assertEqual(response.status_code, 200)
+
+        data["vote"] = {"a": 31, "b": 56}
+        response = self.client.post("/store/", data, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Vote.objects.count(), 1)
+        self.assertEqual(Vote.objects.first().a, 31)
+        self.assertEqual(Vote.objects.first().b, 56)
+
+        # other voter
+        self.get_or_create_user(2)
+        Census(voting_id=5001, voter_id=2).save()
+        data["voter"] = 2
+        response = self.client.post("/store/", data, format="json")
+        self.assertEqual(response.status_code, 401)
+
+        # not in census
+        self.login(user="user2")
+        Census.objects.filter(voter_id=2).delete()
+        response = self.client.post("/store/", data, format="json")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(Vote.objects.count(), 1)
+
+    def test_store_vote_queries(self):
+        if not settings.MODS_LOCAL_DISPATCH:
+            self.skipTest("the queries of the other modules go through the api")
+        data = {"voting": 5001, "voter": 1, "vote": {"a": 30, "b": 55}}
+        Census(voting_id=5001, voter_id=1).save()
+        user = self.get_or_create_user(1)
+        self.login(user=user.username)
+        voting_cache.get_voting(5001)
+
+        # token, dates and census, upsert
+        with self.assertNumQueries(3):
+            response = self.client.post("/store/", data, format="json")
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertNumQueries(3):
+            response = self.client.post("/store/", data, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_store_vote_closed_in_other_process(self):
+        data = {"voting": 5001, "voter": 1, "vote": {"a": 30, "b": 55}}
+        Census(voting_id=5001, voter_id=1).save()
+        user = self.get_or_create_user(1)
+        self.login(user=user.username)
+        voting_cache.get_voting(5001)
+
+        # closed without the signals, the cache keeps the open voting
+        end_date = timezone.now() - datetime.timedelta(seconds=1)
+        Voting.objects.filter(pk=5001).update(end_date=end_date)
+        response = self.client.post("/store/", data, format="json")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(Vote.objects.count(), 0)
+
+    def test_store_running_tally(self):
+        for i in range(3):
+            QuestionOption(question=self.question, option="o{}".format(i)).save()
+        k = MixCrypt(bits=256)
+        p, g = int(k.k.p), int(k.k.g)
+        key = Key(p=p, g=g, y=int(k.k.y), x=int(k.k.x))
+        key.save()
+        self.voting.pub_key = key
+        self.voting.incremental = True
+        self.voting.save()
+
+        def ballot(option):
+            return [k.encrypt(g if i == option else 1) for i in range(3)]
+
+        for voter, option in ((11, 0), (12, 1), (11, 1)):
+            Census.objects.get_or_create(voting_id=5001, voter_id=voter)
+            self.login(user=self.get_or_create_user(voter).username)
+            vote = {"a": 30, "b": 55, "options": ballot(option)}
+            data = {"voting": 5001, "voter": voter, "vote": vote}
+            response = self.client.post("/store/", data, format="json")
+            self.assertEqual(response.status_code, 200)
+
+        # without a cipher for each option
+        data["vote"]["options"] = ballot(1)[:2]
+        response = self.client.post("/store/", data, format="json")
+        self.assertEqual(response.status_code, 400)
+        del data["vote"]["options"]
+        response = self.client.post("/store/", data, format="json")
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get("/store/tally/5001/", format="json")
+        self.assertEqual(response.status_code, 403)
+        self.login()
+        response = self.client.get("/store/tally/5001/", format="json")
+        self.assertEqual(response.status_code, 200)
+        tally = response.json()
+        self.assertEqual(tally["votes"], 2)
+        counts = [small_dlog(k.decrypt(c), g, p, 2) for c in tally["options"]]
+        self.assertEqual(counts, [0, 2, 0])
+        self.assertEqual(RunningTally.objects.get(voting_id=5001).votes, 2)
+
+    def test_vote_index(self):
+        Vote.objects.bulk_create(
+            [Vote(voting_id=i % 10, voter_id=i, a=i, b=i) for i in range(1000)]
+        )
+        self.assertIndexScan(Vote.objects.filter(voting_id=1, voter_id=11))
+        self.assertIndexScan(Vote.objects.filter(voting_id=1))
+
+
+class StoreRemoteTestCase(StoreTextCase):
+    """
+    The same tests, with the voting, authentication and census modules
+    queried through the api
+    """
+
+    def setUp(self):
+        remote = self.settings(MODS_LOCAL_DISPATCH=False)
+        remote.enable()
+        self.addCleanup(remote.disable)
+        super().setUp()
@@ -4,4 +4,9 @@ from . import views
 
 urlpatterns = [
     path("", views.StoreView.as_view(), name="store"),
+    path(
+        "tally/<int:voting_id>/",
+        views.RunningTallyView.as_view(),
+        name="running_tally",
+    ),
 ]
@@ -1,14 +1,129 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 import django_filters.rest_framework
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework import generics
 
-from .models import Vote
+from .models import RunningTally, Vote
 from .serializers import VoteSerializer
-from base import mods
+from base import mods, tokens
 from base.perms import UserIsStaff
+from mixnet.mixcrypt import add_ciphers
+
+
+# modules that StoreView.post can query directly in the database
+LOCAL_MODULES = ("voting", "authentication", "census")
+
+
+def save_vote(vid, uid, a, b, options=None):
+    """
+    Creates the vote, or replaces the previous vote of the voter, with only
+    one insert ... on conflict query
+    """
+
+    Vote.objects.bulk_create(
+        [Vote(voting_id=vid, voter_id=uid, a=a, b=b, options=options)],
+        update_conflicts=True,
+        unique_fields=["voting_id", "voter_id"],
+        update_fields=["a", "b", "options", "voted"],
+    )
+
+
+def is_incremental(voting):
+    """
+    The voting, as returned by the voting api, keeps a running tally. The
+    ranking questions are always counted vote by vote.
+    """
+
+    return bool(voting.get("incremental")) and (
+        voting["question"]["question_type"] != "RANKING"
+    )
+
+
+def parse_id(value):
+    """
+    The id as an int, or None if it isn't an integer
+    """
+
+    try:
+        return int(str(value))
+    except ValueError:
+        return None
+
+
+def parse_cipher(voting, vote):
+    """
+    The (a, b) of the vote as ints, or None if they aren't integers with
+    0 < a < p and 0 <= b < p, p of the voting pub_key
+    """
+
+    if not isinstance(vote, dict):
+        return None
+    try:
+        a, b = int(str(vote.get("a"))), int(str(vote.get("b")))
+    except ValueError:
+        return None
+
+    pk = voting.get("pub_key")
+    p = int(pk["p"]) if pk else None
+    if a <= 0 or b < 0 or (p and (a >= p or b >= p)):
+        return None
+    return a, b
+
+
+def parse_ballot(voting, vote):
+    """
+    The options of the vote as a list of [a, b], or None if there isn't a
+    valid cipher for each option of the voting
+    """
+
+    options = vote.get("options")
+    pk = voting.get("pub_key")
+    if not pk or not isinstance(options, list):
+        return None
+    if len(options) != len(voting["question"]["options"]):
+        return None
+
+    p = int(pk["p"])
+    try:
+        ballot = [[int(a), int(b)] for a, b in options]
+    except (TypeError, ValueError):
+        return None
+    if not all(0 < c < p for cipher in ballot for c in cipher):
+        return None
+    return ballot
+
+
+def save_ballot(vid, uid, a, b, ballot, p):
+    """
+    Saves the vote and adds its options to the running tally of the voting,
+    taking out the previous ballot of the voter. The running tally row is
+    locked, so the ballots of a voting are added one at a time.
+    """
+
+    with transaction.atomic():
+        tally, _ = RunningTally.objects.select_for_update().get_or_create(
+            voting_id=vid, defaults={"options": [[1, 1]] * len(ballot)}
+        )
+        previous = (
+            Vote.objects.filter(voting_id=vid, voter_id=uid)
+            .values_list("options", flat=True)
+            .first()
+        )
+        save_vote(vid, uid, a, b, ballot)
+
+        options = add_ciphers(tally.options, ballot, p)
+        if previous:
+            options = add_ciphers(options, previous, p, sub=True)
+        else:
+            tally.votes += 1
+        tally.options = options
+        tally.save()
 
 
 class StoreView(generics.ListAPIView):
@@ -22,14 +137,52 @@ class StoreView(generics.ListAPIView):
         self.check_permissions(request)
         return super().get(request)
 
+    def filter_queryset(self, queryset):
+        """
+        Besides the filter fields, votes can be read in pages ordered by id:
+
+        * after: id / nullable, only votes with a greater id
+        * limit: int / nullable, max number of votes, up to
+          settings.STORE_MAX_LIMIT
+        """
+
+        queryset = super().filter_queryset(queryset)
+        after = self.request.query_params.get("after")
+        limit = self.request.query_params.get("limit")
+        try:
+            after = int(after) if after else None
+            limit = int(limit) if limit else None
+        except ValueError:
+            raise ValidationError("after and limit must be integers")
+        if limit is not None and limit < 1:
+            raise ValidationError("limit must be positive")
+
+        if after is not None or limit is not None:
+            queryset = queryset.order_by("id")
+        if after is not None:
+            queryset = queryset.filter(id__gt=after)
+        if limit is not None:
+            queryset = queryset[: min(limit, settings.STORE_MAX_LIMIT)]
+        return queryset
+
     def post(self, request):
         """
         * voting: id
         * voter: id
-        * vote: { "a": int, "b": int }
+        * vote: { "a": int, "b": int, "options": [ [int, int] ] / nullable }
+
+        In the votings with a running tally the vote also has the options,
+        one exponential ElGamal cipher of g^1 or g^0 = 1 for each option,
+        in the order of the option numbers.
         """
 
         vid = request.data.get("voting")
+        if vid and parse_id(vid) is None:
+            return Response({}, status=status.HTTP_401_UNAUTHORIZED)
+
+        if all(mods.is_local_module(m) for m in LOCAL_MODULES):
+            return self.local_post(request)
+
         voting = mods.get("voting", params={"id": vid})
         if not voting or not isinstance(voting, list):
             return Response({}, status=status.HTTP_401_UNAUTHORIZED)
@@ -51,9 +204,7 @@ class StoreView(generics.ListAPIView):
             token = request.auth.key
         else:
             token = "NO-AUTH-VOTE"
-        voter = mods.post(
-            "authentication", entry_point="/getuser/", json={"token": token}
-        )
+        voter = tokens.get_user(token) or {}
         voter_id = voter.get("id", None)
         if not voter_id or voter_id != uid:
             return Response({}, status=status.HTTP_401_UNAUTHORIZED)
@@ -65,15 +216,94 @@ class StoreView(generics.ListAPIView):
         if perms.status_code == 401:
             return Response({}, status=status.HTTP_401_UNAUTHORIZED)
 
-        a = vote.get("a")
-        b = vote.get("b")
+        return self.store_vote(voting[0], vid, uid, vote)
+
+    def local_post(self, request):
+        """
+        Same as post, but when voting, authentication and census are in this
+        deployment: the voter comes from the token authentication, the
+        voting from the votings cache, and the voting dates and the census
+        are read with only one query. The dates aren't taken from the cache,
+        the cache of the other processes can keep an old end_date.
+        """
+
+        from census.models import Census
+        from voting import cache
+        from voting.models import Voting
+
+        vid = request.data.get("voting")
+        uid = request.data.get("voter")
+        vote = request.data.get("vote")
+
+        if not vid or not uid or not vote:
+            return Response({}, status=status.HTTP_400_BAD_REQUEST)
 
-        defs = {"a": a, "b": b}
-        v, _ = Vote.objects.get_or_create(voting_id=vid, voter_id=uid, defaults=defs)
+        # validating voter
+        if not request.auth or request.user.id != uid:
+            return Response({}, status=status.HTTP_401_UNAUTHORIZED)
 
-        v.a = a
-        v.b = b
+        voting = cache.get_voting(vid)
+        if not voting:
+            return Response({}, status=status.HTTP_401_UNAUTHORIZED)
 
-        v.save()
+        census = Census.objects.filter(voting_id=vid, voter_id=uid)
+        dates = (
+            Voting.objects.filter(pk=vid)
+            .annotate(in_census=Exists(census))
+            .values_list("start_date", "end_date", "in_census")
+            .first()
+        )
+        if not dates:
+            return Response({}, status=status.HTTP_401_UNAUTHORIZED)
+
+        start_date, end_date, in_census = dates
+        now = timezone.now()
+        is_closed = end_date and end_date < now
+        if not start_date or start_date > now or is_closed:
+            return Response({}, status=status.HTTP_401_UNAUTHORIZED)
+
+        if not in_census:
+            return Response({}, status=status.HTTP_401_UNAUTHORIZED)
+
+        return self.store_vote(voting, vid, uid, vote)
+
+    def store_vote(self, voting, vid, uid, vote):
+        cipher = parse_cipher(voting, vote)
+        if cipher is None:
+            return Response({}, status=status.HTTP_400_BAD_REQUEST)
+        a, b = cipher
+
+        if not is_incremental(voting):
+            save_vote(vid, uid, a, b)
+            return Response({})
+
+        ballot = parse_ballot(voting, vote)
+        if ballot is None:
+            return Response({}, status=status.HTTP_400_BAD_REQUEST)
+        save_ballot(vid, uid, a, b, ballot, int(voting["pub_key"]["p"]))
 
         return Response({})
+
+
+class RunningTallyView(generics.GenericAPIView):
+    permission_classes = (UserIsStaff,)
+
+    def get(self, request, voting_id):
+        """
+        The running tally of the voting:
+
+        * voting_id: id
+        * votes: int, number of voters
+        * options: [ [int, int] ], the sum of the ballots of each option
+        """
+
+        tally = RunningTally.objects.filter(voting_id=voting_id).first()
+        if not tally:
+            return Response({"voting_id": voting_id, "votes": 0, "options": []})
+        return Response(
+            {
+                "voting_id": voting_id,
+                "votes": tally.votes,
+                "options": tally.options,
+            }
+        )
@@ -14,8 +14,15 @@ class VisualizerView(TemplateView):
         vid = kwargs.get("voting_id", 0)
 
         try:
-            r = mods.get("voting", params={"id": vid})
-            context["voting"] = json.dumps(r[0])
+            if mods.is_local_module("voting"):
+                from voting import cache as voting_cache
+
+                voting = voting_cache.get_voting(vid)
+            else:
+                voting = mods.get("voting", params={"id": vid})[0]
+            if voting is None:
+                raise Http404
+            context["voting"] = json.dumps(voting)
         except:
             raise Http404
 
@@ -6,6 +6,7 @@ from .models import Question
 from .models import Voting
 
 from .filters import StartedFilter
+from .jobs import submit_tally
 
 
 def start(modeladmin, request, queryset):
@@ -23,8 +24,10 @@ def stop(ModelAdmin, request, queryset):
 
 def tally(ModelAdmin, request, queryset):
     for v in queryset.filter(end_date__lt=timezone.now()):
+        if v.tally:
+            continue
         token = request.session.get("auth-token", "")
-        v.tally_votes(token)
+        submit_tally(v, token)
 
 
 class QuestionOptionInline(admin.TabularInline):
@@ -36,8 +39,18 @@ class QuestionAdmin(admin.ModelAdmin):
 
 
 class VotingAdmin(admin.ModelAdmin):
-    list_display = ("name", "start_date", "end_date")
-    readonly_fields = ("start_date", "end_date", "pub_key", "tally", "postproc")
+    list_display = ("name", "start_date", "end_date", "tally_status", "tally_progress")
+    readonly_fields = (
+        "start_date",
+        "end_date",
+        "pub_key",
+        "tally",
+        "postproc",
+        "incremental",
+        "quick_count",
+        "tally_status",
+        "tally_progress",
+    )
     date_hierarchy = "start_date"
     list_filter = (StartedFilter,)
     search_fields = ("name",)
@@ -0,0 +1,68 @@
+"""
+Cache of the votings metadata.
+
+The store, the booth and the visualizer need the voting (dates, question,
+pub_key) for each request. Instead of querying and serializing the voting
+each time, the serialized voting is stored in the django cache, with the
+key voting:<id>, and it's removed when the voting changes.
+
+With the default LocMemCache the votings are removed only from the cache
+of the process that changed them, the other processes can read the old
+voting for settings.VOTING_CACHE_TTL seconds. So the cache is only used to
+read the votings, the store reads the dates from the database before
+saving a vote.
+"""
+
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.dateparse import parse_datetime
+from rest_framework.renderers import JSONRenderer
+
+from .models import Voting
+from .serializers import VotingSerializer
+
+
+KEY = "voting:{}"
+
+
+def serialize(voting):
+    data = JSONRenderer().render(VotingSerializer(voting).data)
+    return json.loads(data)
+
+
+def get_voting(vid):
+    """
+    Returns the voting as returned by the api GET /voting/?id=vid, or
+    None if the voting doesn't exist
+    """
+
+    key = KEY.format(vid)
+    data = cache.get(key)
+    if data is None:
+        voting = (
+            Voting.objects.filter(pk=vid)
+            .select_related("question", "pub_key")
+            .prefetch_related("question__options", "auths")
+            .first()
+        )
+        if voting is None:
+            return None
+        data = serialize(voting)
+        cache.set(key, data, settings.VOTING_CACHE_TTL)
+    return data
+
+
+def get_dates(voting):
+    """
+    start_date and end_date of a cached voting as datetimes
+    """
+
+    start = voting["start_date"]
+    end = voting["end_date"]
+    return (start and parse_datetime(start), end and parse_datetime(end))
+
+
+def invalidate(*vids):
+    cache.delete_many([KEY.format(vid) for vid in vids])
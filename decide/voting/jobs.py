@@ -0,0 +1,65 @@
+"""
+Local job runner for the tallies.
+
+The tally can take a long time for big votings, so it's run in a thread
+pool of this process instead of inside the http request. The progress is
+stored in Voting.tally_status and Voting.tally_progress.
+
+The jobs are lost if the process ends, so a running tally whose status
+hasn't changed for settings.TALLY_STALE_TIMEOUT seconds can be started
+again.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import Voting
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.TALLY_JOB_WORKERS)
+    return _executor
+
+
+def run_tally(voting_id, token="", background=False):
+    try:
+        voting = Voting.objects.get(pk=voting_id)
+        voting.tally_votes(token)
+    except Exception:
+        Voting.objects.filter(pk=voting_id).update(
+            tally_status=Voting.TallyStatus.FAILED
+        )
+        if not background:
+            raise
+        logger.exception("Tally of voting %s failed", voting_id)
+    finally:
+        if background:
+            close_old_connections()
+
+
+def submit_tally(voting, token=""):
+    """
+    Queues the tally of this voting. Returns None if another tally of the
+    voting is running, and True if the tally is already done, that's when
+    settings.TALLY_BACKGROUND is disabled.
+    """
+
+    if not voting.start_tally():
+        return None
+    if settings.TALLY_BACKGROUND:
+        get_executor().submit(run_tally, voting.id, token, True)
+        return False
+
+    run_tally(voting.id, token)
+    voting.refresh_from_db()
+    return True
@@ -0,0 +1,98 @@
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+
+from base.models import Auth
+from mixnet.mixcrypt import ElGamal, MixCrypt
+from mixnet.models import Mixnet
+from store.models import Vote
+from voting.models import Question, QuestionOption, Voting
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the end to end tally of a voting with the given auths: "
+        "chained mixnets (each auth calls the next one), orchestrated by "
+        "the voting, and orchestrated with TALLY_PIPELINE chunks in the "
+        "mixnets at the same time. The auths other than BASEURL should be "
+        "running servers with their own BASEURL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--votes", type=int, default=1000)
+        parser.add_argument("--auths", nargs="+", default=[settings.BASEURL])
+        parser.add_argument("--chunk", type=int, default=100)
+        parser.add_argument("--pipeline", type=int, default=4)
+
+    def create_voting(self, urls):
+        q = Question.objects.create(desc="benchmark question")
+        for i in range(5):
+            QuestionOption(question=q, option="option {}".format(i + 1)).save()
+        v = Voting.objects.create(name="benchmark voting", question=q)
+        for i, url in enumerate(urls):
+            a = Auth.objects.filter(url=url).first() or Auth.objects.create(
+                url=url, me=url == settings.BASEURL, name=url
+            )
+            v.auths.add(a)
+        v.create_pubkey()
+        return v
+
+    def store_votes(self, v, n):
+        pk = v.pub_key
+        k = MixCrypt(bits=settings.KEYBITS, generate=False)
+        k.k = ElGamal.construct((pk.p, pk.g, pk.y))
+        options = [o.number for o in v.question.options.all()]
+        votes = []
+        for i in range(n):
+            a, b = k.encrypt(random.choice(options))
+            votes.append(Vote(voting_id=v.id, voter_id=i + 1, a=a, b=b))
+        Vote.objects.bulk_create(votes, batch_size=1000)
+
+    def measure(self, name, v, token, **overrides):
+        with override_settings(**overrides):
+            t = time.perf_counter()
+            v.tally_votes(token)
+            t = time.perf_counter() - t
+        options = {o.number for o in v.question.options.all()}
+        ok = "ok" if set(v.tally) <= options else "wrong tally"
+        print(
+            " * {:14} {:8.2f}s {:8.1f} votes/s {}".format(name, t, len(v.tally) / t, ok)
+        )
+
+    def handle(self, *args, **options):
+        n = options["votes"]
+        chunk = options["chunk"]
+        user, _ = User.objects.get_or_create(
+            username="benchmark", defaults={"is_staff": True}
+        )
+        token, _ = Token.objects.get_or_create(user=user)
+
+        auths = options["auths"]
+        print("{} votes, {} auths, chunks of {}".format(n, len(auths), chunk))
+        v = self.create_voting(auths)
+        try:
+            self.store_votes(v, n)
+            common = {
+                "TALLY_BACKGROUND": False,
+                "TALLY_CHUNK_SIZE": chunk,
+                "TALLY_MIN_CHUNK_SIZE": 1,
+            }
+            self.measure("chained", v, token.key, MIXNET_CHAIN=True, **common)
+            self.measure("orchestrated", v, token.key, MIXNET_CHAIN=False, **common)
+            self.measure(
+                "pipelined",
+                v,
+                token.key,
+                MIXNET_CHAIN=False,
+                TALLY_PIPELINE=options["pipeline"],
+                **common,
+            )
+        finally:
+            Vote.objects.filter(voting_id=v.id).delete()
+            Mixnet.objects.filter(voting_id=v.id).delete()
+            v.question.delete()
@@ -17,20 +17,33 @@ from voting.models import Voting, Question, QuestionOption
 class Command(BaseCommand):
     help = "Test the full voting process with one auth (self)"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="keep a running tally, decrypting only the sum of each option",
+        )
+
     def encrypt_msg(self, msg, v, bits=settings.KEYBITS):
         pk = v.pub_key
         p, g, y = (pk.p, pk.g, pk.y)
-        k = MixCrypt(bits=bits)
+        k = MixCrypt(bits=bits, generate=False)
         k.k = ElGamal.construct((p, g, y))
         return k.encrypt(msg)
 
-    def create_voting(self):
+    def encrypt_ballot(self, number, v):
+        # g^1 for the chosen option and g^0 = 1 for the others
+        g = v.pub_key.g
+        options = sorted(o.number for o in v.question.options.all())
+        return [self.encrypt_msg(g if n == number else 1, v) for n in options]
+
+    def create_voting(self, incremental=False):
         q = Question(desc="test question")
         q.save()
         for i in range(5):
             opt = QuestionOption(question=q, option="option {}".format(i + 1))
             opt.save()
-        v = Voting(name="test voting", question=q)
+        v = Voting(name="test voting", question=q, incremental=incremental)
         v.save()
 
         a, _ = Auth.objects.get_or_create(
@@ -62,6 +75,8 @@ class Command(BaseCommand):
                     "voter": voter.voter_id,
                     "vote": {"a": a, "b": b},
                 }
+                if v.incremental:
+                    data["vote"]["options"] = self.encrypt_ballot(opt.number, v)
                 clear[opt.number] += 1
                 voter = voters.pop()
                 mods.post("store", json=data)
@@ -69,7 +84,7 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         print("Creating voting")
-        v = self.create_voting()
+        v = self.create_voting(options["incremental"])
         self.create_voters(v)
 
         print("Creating pubkey")
@@ -102,3 +117,9 @@ class Command(BaseCommand):
                     q["option"], q["postproc"], q["votes"]
                 )
             )
+
+        if v.quick_count:
+            print("")
+            print("Quick count (not binding):")
+            for q in v.quick_count:
+                print(" * {}: {} votes".format(q["number"], q["votes"]))
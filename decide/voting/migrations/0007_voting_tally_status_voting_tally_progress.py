@@ -0,0 +1,35 @@
+# Generated by Django 4.1 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voting", "0006_alter_question_question_type"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="voting",
+            name="tally_progress",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="voting",
+            name="tally_status",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("queued", "Queued"),
+                    ("shuffling", "Shuffling"),
+                    ("decrypting", "Decrypting"),
+                    ("postproc", "Postproc"),
+                    ("done", "Done"),
+                    ("failed", "Failed"),
+                ],
+                max_length=20,
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1 on 2026-10-18 08:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voting", "0007_voting_tally_status_voting_tally_progress"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="voting",
+            name="incremental",
+            field=models.BooleanField(default=False),
+        ),
+    ]
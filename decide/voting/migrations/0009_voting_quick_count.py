@@ -0,0 +1,18 @@
+# Generated by Django 4.1 on 2026-10-18 09:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voting", "0008_voting_incremental"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="voting",
+            name="quick_count",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
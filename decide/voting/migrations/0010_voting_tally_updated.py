@@ -0,0 +1,18 @@
+# Generated by Django 4.1 on 2026-10-18 10:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voting", "0009_voting_quick_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="voting",
+            name="tally_updated",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,10 +1,19 @@
-from django.db import models
-from django.db.models import JSONField
-from django.db.models.signals import post_save
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from Crypto.Random import random
+from django.conf import settings
+from django.db import connection, models
+from django.db.models import JSONField, Q
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
+from django.utils import timezone
 
 from base import mods
 from base.models import Auth, Key
+from mixnet import codec
+from mixnet.mixcrypt import small_dlog
 
 
 class Question(models.Model):
@@ -54,17 +63,105 @@ class Voting(models.Model):
     )
     auths = models.ManyToManyField(Auth, related_name="votings")
 
+    # the store keeps the sum of the ballots of each option as they arrive
+    incremental = models.BooleanField(default=False)
+
     tally = JSONField(blank=True, null=True)
     postproc = JSONField(blank=True, null=True)
+    # votes of each option in the running tally, not binding: the store
+    # can't check that the sums match the ballots that are tallied
+    quick_count = JSONField(blank=True, null=True)
+
+    class TallyStatus(models.TextChoices):
+        QUEUED = "queued", "Queued"
+        SHUFFLING = "shuffling", "Shuffling"
+        DECRYPTING = "decrypting", "Decrypting"
+        POSTPROC = "postproc", "Postproc"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    tally_status = models.CharField(
+        max_length=20, choices=TallyStatus.choices, blank=True, null=True
+    )
+    # number of votes already shuffled and decrypted
+    tally_progress = models.PositiveIntegerField(default=0)
+    # last change of the tally status or progress
+    tally_updated = models.DateTimeField(blank=True, null=True)
+
+    RUNNING = (
+        TallyStatus.QUEUED,
+        TallyStatus.SHUFFLING,
+        TallyStatus.DECRYPTING,
+        TallyStatus.POSTPROC,
+    )
+
+    @classmethod
+    def stale_tally_date(cls):
+        """
+        The running tallies without changes since this date are stale, the
+        process that was running them died
+        """
+
+        return timezone.now() - timedelta(seconds=settings.TALLY_STALE_TIMEOUT)
+
+    def tally_running(self):
+        return (
+            self.tally_status in self.RUNNING
+            and self.tally_updated is not None
+            and self.tally_updated >= self.stale_tally_date()
+        )
+
+    def start_tally(self):
+        """
+        Sets the tally status to queued, unless another tally of this voting
+        is running, with only one conditional update so two requests can't
+        start the tally at the same time. Returns True if the status was set.
+        """
+
+        not_running = (
+            Q(tally_status__isnull=True)
+            | ~Q(tally_status__in=self.RUNNING)
+            | Q(tally_updated__isnull=True)
+            | Q(tally_updated__lt=self.stale_tally_date())
+        )
+        now = timezone.now()
+        started = (
+            Voting.objects.filter(not_running, pk=self.pk).update(
+                tally_status=self.TallyStatus.QUEUED,
+                tally_progress=0,
+                tally_updated=now,
+            )
+            == 1
+        )
+        if started:
+            self.tally_status = self.TallyStatus.QUEUED
+            self.tally_progress = 0
+            self.tally_updated = now
+        return started
+
+    def set_tally_status(self, status, progress=None):
+        """
+        Stores the tally status without saving the rest of the fields, so
+        it can be read by the progress endpoint while the tally runs
+        """
+
+        self.tally_status = status
+        self.tally_updated = timezone.now()
+        fields = {"tally_status": status, "tally_updated": self.tally_updated}
+        if progress is not None:
+            self.tally_progress = progress
+            fields["tally_progress"] = progress
+        Voting.objects.filter(pk=self.pk).update(**fields)
 
     def create_pubkey(self):
         if self.pub_key or not self.auths.count():
             return
 
-        auth = self.auths.first()
+        auths = self.auths.order_by("pk")
+        auth = auths.first()
         data = {
             "voting": self.id,
-            "auths": [{"name": a.name, "url": a.url} for a in self.auths.all()],
+            "auths": [{"name": a.name, "url": a.url} for a in auths],
         }
         key = mods.post("mixnet", baseurl=auth.url, json=data)
         pk = Key(p=key["p"], g=key["g"], y=key["y"])
@@ -77,6 +174,9 @@ class Voting(models.Model):
         votes = mods.get(
             "store", params={"voting_id": self.id}, HTTP_AUTHORIZATION="Token " + token
         )
+        return self.format_votes(votes)
+
+    def format_votes(self, votes):
         # anon votes
         votes_format = []
         vote_list = []
@@ -90,49 +190,195 @@ class Voting(models.Model):
             votes_format = []
         return vote_list
 
+    def iter_votes(self, token="", chunk=0):
+        """
+        Yields the votes from the store in pages of chunk votes, so we
+        never have the whole list in memory. With chunk=0 all the votes
+        are returned in only one page.
+        """
+
+        if not chunk:
+            yield self.get_votes(token)
+            return
+
+        after = 0
+        while True:
+            params = {"voting_id": self.id, "after": after, "limit": chunk}
+            votes = mods.get(
+                "store", params=params, HTTP_AUTHORIZATION="Token " + token
+            )
+            # the store can return less votes than chunk, up to its
+            # STORE_MAX_LIMIT, so the pages end with an empty one
+            if not votes:
+                break
+            after = votes[-1]["id"]
+            yield self.format_votes(votes)
+
     def tally_votes(self, token=""):
         """
-        The tally is a shuffle and then a decrypt
+        The tally is a shuffle and then a decrypt.
+
+        If settings.TALLY_CHUNK_SIZE is set the votes are read from the store
+        and sent to the mixnet in chunks of that size, so the memory and the
+        size of the requests don't grow with the census. Each chunk is
+        shuffled on its own, so a vote is only mixed with the votes of its
+        chunk: the chunks are at least settings.TALLY_MIN_CHUNK_SIZE votes,
+        and the decrypted tally is shuffled again before it's saved, so its
+        order doesn't tell the chunk (the page of the store) of each vote.
+
+        With settings.TALLY_PIPELINE > 1 that number of chunks are in the
+        mixnets at the same time, so while an auth works on a chunk the
+        previous auth is already working on the next one.
+
+        The votings with a running tally first decrypt the sum of each
+        option as the quick_count, see decrypt_running_tally. The tally is
+        always the shuffle and decrypt of the votes.
         """
 
-        votes = self.get_votes(token)
+        if self.is_incremental():
+            self.quick_count = self.decrypt_running_tally(token)
+            self.save(update_fields=["quick_count"])
 
-        auth = self.auths.first()
-        shuffle_url = "/shuffle/{}/".format(self.id)
-        decrypt_url = "/decrypt/{}/".format(self.id)
-        auths = [{"name": a.name, "url": a.url} for a in self.auths.all()]
+        tally = []
+        auths = self.mixnet_auths()
+        self.set_tally_status(self.TallyStatus.SHUFFLING, 0)
+        chunk = settings.TALLY_CHUNK_SIZE
+        if chunk:
+            chunk = max(chunk, settings.TALLY_MIN_CHUNK_SIZE)
+        chunks = self.iter_votes(token, chunk)
+        for msgs in self.mix_chunks(chunks, auths, settings.TALLY_PIPELINE):
+            tally += msgs
+            self.set_tally_status(self.tally_status, len(tally))
 
-        # first, we do the shuffle
-        data = {"msgs": votes}
-        response = mods.post(
-            "mixnet",
-            entry_point=shuffle_url,
-            baseurl=auth.url,
-            json=data,
-            response=True,
+        random.shuffle(tally)
+        self.tally = tally
+        self.save()
+
+        self.set_tally_status(self.TallyStatus.POSTPROC)
+        self.do_postproc()
+        self.set_tally_status(self.TallyStatus.DONE)
+
+    def is_incremental(self):
+        """
+        The store keeps a running tally of this voting. The ranking
+        questions are always counted vote by vote.
+        """
+
+        return self.incremental and (
+            self.question.question_type != Question.QuestionType.RANKING
         )
-        if response.status_code != 200:
-            # TODO: manage error
-            pass
 
-        # then, we can decrypt that
-        data = {"msgs": response.json()}
-        response = mods.post(
-            "mixnet",
-            entry_point=decrypt_url,
-            baseurl=auth.url,
-            json=data,
-            response=True,
+    def decrypt_running_tally(self, token=""):
+        """
+        Decrypts the running tally of the store, one cipher for each option
+        with g^count, and returns the count of each option as
+        [{"number": int, "votes": int}], or None if a sum isn't a count of
+        the voters. The ballots of the running tally aren't proven, so this
+        is only a quick count, never the tally.
+        """
+
+        sums = mods.get(
+            "store/tally/{}".format(self.id), HTTP_AUTHORIZATION="Token " + token
+        )
+        votes = sums["votes"]
+        numbers = sorted(o.number for o in self.question.options.all())
+        if not votes:
+            return [{"number": number, "votes": 0} for number in numbers]
+
+        clears = self.mixnet_step(
+            "decrypt", sums["options"], self.mixnet_auths(), shuffle=False
         )
+        if len(clears) != len(numbers):
+            return None
+        p, g = self.pub_key.p, self.pub_key.g
 
-        if response.status_code != 200:
-            # TODO: manage error
-            pass
+        counts = []
+        for number, clear in zip(numbers, clears):
+            count = small_dlog(clear, g, p, votes)
+            if count is None:
+                return None
+            counts.append({"number": number, "votes": count})
+        return counts
 
-        self.tally = response.json()
-        self.save()
+    def mix_chunks(self, chunks, auths, pipeline=1):
+        """
+        Yields the mixed chunks in order, with up to pipeline chunks in the
+        mixnets at the same time
+        """
 
-        self.do_postproc()
+        if pipeline <= 1:
+            for votes in chunks:
+                yield self.mix_votes(votes, auths)
+            return
+
+        def mix(votes):
+            try:
+                return self.mix_votes(votes, auths, status=False)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=pipeline) as executor:
+            pending = deque()
+            for votes in chunks:
+                pending.append(executor.submit(mix, votes))
+                if len(pending) >= pipeline:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def mixnet_auths(self):
+        """
+        The auths in the order of the mixnet chain, the same order used to
+        create the key: each auth calls the next one with a different url
+        """
+
+        chain = []
+        auths = list(self.auths.order_by("pk"))
+        while auths:
+            chain.append(auths[0])
+            auths = [a for a in auths if a.url != chain[-1].url]
+        return chain
+
+    def mix_votes(self, votes, auths=None, status=True):
+        """
+        Shuffles and decrypts a list of votes with the mixnet
+        """
+
+        auths = auths or self.mixnet_auths()
+
+        # first, we do the shuffle
+        if status:
+            self.set_tally_status(self.TallyStatus.SHUFFLING)
+        shuffled = self.mixnet_step("shuffle", votes, auths)
+
+        # then, we can decrypt that
+        if status:
+            self.set_tally_status(self.TallyStatus.DECRYPTING)
+        return self.mixnet_step("decrypt", shuffled, auths)
+
+    def mixnet_step(self, step, msgs, auths, **extra):
+        """
+        Shuffles or decrypts the msgs with all the auths.
+
+        With settings.MIXNET_CHAIN the first auth calls the next one and so
+        on. If not, the voting calls each auth in turn, so every auth only
+        keeps the connection open for its own work. The extra fields are
+        sent to every auth.
+        """
+
+        url = "/{}/{}/".format(step, self.id)
+        data = {"msgs": msgs, **extra}
+        if self.pub_key:
+            # the votes are re-encrypted with the key of all the auths
+            pk = self.pub_key
+            data["pk"] = {"p": pk.p, "g": pk.g, "y": pk.y}
+        if settings.MIXNET_CHAIN:
+            return codec.post(url, auths[0].url, data)
+
+        for position, auth in enumerate(auths):
+            data.update(msgs=msgs, position=position, chain=False)
+            msgs = codec.post(url, auth.url, data)
+        return msgs
 
     def do_postproc(self):
         tally = self.tally
@@ -173,3 +419,33 @@ class Voting(models.Model):
 
     def __str__(self):
         return self.name
+
+
+@receiver(post_save, sender=Voting)
+@receiver(post_delete, sender=Voting)
+def invalidate_voting(sender, instance, **kwargs):
+    from .cache import invalidate
+
+    invalidate(instance.pk)
+
+
+@receiver(m2m_changed, sender=Voting.auths.through)
+def invalidate_voting_auths(sender, instance, reverse, pk_set, **kwargs):
+    from .cache import invalidate
+
+    if not reverse:
+        invalidate(instance.pk)
+    elif pk_set:
+        invalidate(*pk_set)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+@receiver(post_save, sender=QuestionOption)
+@receiver(post_delete, sender=QuestionOption)
+def invalidate_question_votings(sender, instance, **kwargs):
+    from .cache import invalidate
+
+    question_id = instance.pk if sender is Question else instance.question_id
+    vids = Voting.objects.filter(question_id=question_id).values_list("pk", flat=True)
+    invalidate(*vids)
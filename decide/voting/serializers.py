@@ -34,8 +34,10 @@ class VotingSerializer(serializers.HyperlinkedModelSerializer):
             "end_date",
             "pub_key",
             "auths",
+            "incremental",
             "tally",
             "postproc",
+            "quick_count",
         )
 
 
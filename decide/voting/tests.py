@@ -1,11 +1,13 @@
 import random
 import itertools
+from datetime import timedelta
+from unittest import mock
 from django.urls import reverse
 from django.utils import timezone
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.staticfiles.testing import StaticLiveServerTestCase
-from django.test import Client, RequestFactory, TestCase
+from django.test import Client, RequestFactory, TestCase, override_settings
 
 from selenium import webdriver
 from selenium.webdriver.support.ui import Select
@@ -19,6 +21,8 @@ from census.models import Census
 from mixnet.mixcrypt import ElGamal
 from mixnet.mixcrypt import MixCrypt
 from mixnet.models import Auth
+from store.models import RunningTally
+from voting import cache as voting_cache
 from voting.models import Voting, Question, QuestionOption
 from voting.forms import QuestionForm, QuestionOptionFormSet, VotingForm
 
@@ -37,13 +41,13 @@ class VotingTestCase(BaseTestCase):
         k.k = ElGamal.construct((p, g, y))
         return k.encrypt(msg)
 
-    def create_voting(self):
+    def create_voting(self, incremental=False):
         q = Question(desc="test question")
         q.save()
         for i in range(5):
             opt = QuestionOption(question=q, option="option {}".format(i + 1))
             opt.save()
-        v = Voting(name="test voting", question=q)
+        v = Voting(name="test voting", question=q, incremental=incremental)
         v.save()
 
         a, _ = Auth.objects.get_or_create(
@@ -83,6 +87,13 @@ class VotingTestCase(BaseTestCase):
                     "voter": voter.voter_id,
                     "vote": {"a": a, "b": b},
                 }
+                if v.incremental:
+                    g = v.pub_key.g
+                    numbers = sorted(o.number for o in v.question.options.all())
+                    data["vote"]["options"] = [
+                        self.encrypt_msg(g if n == opt.number else 1, v)
+                        for n in numbers
+                    ]
                 clear[opt.number] += 1
                 user = self.get_or_create_user(voter.voter_id)
                 self.login(user=user.username)
@@ -90,6 +101,161 @@ class VotingTestCase(BaseTestCase):
                 mods.post("store", json=data)
         return clear
 
+    def complete_voting(self, incremental=False):
+        v = self.create_voting(incremental)
+        self.create_voters(v)
+
+        v.create_pubkey()
+        v.start_date = timezone.now()
+        v.save()
+
+        clear = self.store_votes(v)
+
+        self.login()  # set token
+        v.tally_votes(self.token)
+
+        tally = v.tally
+        tally.sort()
+        tally = {k: len(list(x)) for k, x in itertools.groupby(tally)}
+
+        for q in v.question.options.all():
+            self.assertEqual(tally.get(q.number, 0), clear.get(q.number, 0))
+
+        for q in v.postproc:
+            self.assertEqual(tally.get(q["number"], 0), q["votes"])
+
+        if incremental:
+            for q in v.quick_count:
+                self.assertEqual(q["votes"], clear.get(q["number"], 0))
+
+    def test_complete_voting(self):
+        self.complete_voting()
+
+    @override_settings(TALLY_CHUNK_SIZE=3, TALLY_MIN_CHUNK_SIZE=1)
+    def test_complete_voting_chunks(self):
+        self.complete_voting()
+
+    @override_settings(MIXNET_FORMAT="json")
+    def test_complete_voting_json(self):
+        self.complete_voting()
+
+    @override_settings(MIXNET_CHAIN=False, TALLY_CHUNK_SIZE=4, TALLY_MIN_CHUNK_SIZE=1)
+    def test_complete_voting_orchestrated(self):
+        self.complete_voting()
+
+    def test_complete_voting_incremental(self):
+        self.complete_voting(incremental=True)
+
+    def test_quick_count_not_binding(self):
+        v = self.create_voting(incremental=True)
+        self.create_voters(v)
+        v.create_pubkey()
+        v.start_date = timezone.now()
+        v.save()
+        clear = self.store_votes(v)
+
+        # a ballot that adds g^1000 to the first option
+        tally = RunningTally.objects.get(voting_id=v.id)
+        a, b = tally.options[0]
+        tally.options[0] = [a, b * pow(v.pub_key.g, 1000, v.pub_key.p) % v.pub_key.p]
+        tally.save()
+
+        self.login()
+        v.tally_votes(self.token)
+        self.assertIsNone(v.quick_count)
+        self.assertEqual(len(v.tally), sum(clear.values()))
+
+    @override_settings(MIXNET_CHAIN=False)
+    def test_complete_voting_incremental_orchestrated(self):
+        self.complete_voting(incremental=True)
+
+    def test_is_incremental(self):
+        v = self.create_voting(incremental=True)
+        self.assertTrue(v.is_incremental())
+        v.question.question_type = Question.QuestionType.RANKING
+        self.assertFalse(v.is_incremental())
+
+    def test_mix_chunks_pipeline(self):
+        v = self.create_voting()
+        chunks = [[i, i + 1] for i in range(0, 20, 2)]
+        with mock.patch.object(Voting, "mix_votes", lambda self, votes, *a, **k: votes):
+            mixed = list(v.mix_chunks(iter(chunks), [], pipeline=3))
+        self.assertEqual(mixed, chunks)
+
+    def test_mixnet_auths(self):
+        v = self.create_voting()
+        a2 = Auth.objects.create(url="http://auth2:8000", name="auth2")
+        a3 = Auth.objects.create(url=settings.BASEURL, name="auth3")
+        v.auths.add(a2, a3)
+        self.assertEqual(v.mixnet_auths(), [v.auths.order_by("pk").first(), a2])
+
+    @override_settings(TALLY_BACKGROUND=False)
+    def test_tally_status(self):
+        v = self.create_voting()
+        self.create_voters(v)
+        v.create_pubkey()
+        v.start_date = timezone.now()
+        v.save()
+        clear = self.store_votes(v)
+        v.end_date = timezone.now()
+        v.save()
+
+        self.login()
+        data = {"action": "tally"}
+        response = self.client.put("/voting/{}/".format(v.pk), data, format="json")
+        self.assertEqual(response.status_code, 200)
+
+        v.refresh_from_db()
+        self.assertEqual(v.tally_status, Voting.TallyStatus.DONE)
+        self.assertEqual(v.tally_progress, sum(clear.values()))
+
+        self.client.force_login(User.objects.get(username="admin"))
+        response = self.client.get("/voting/tally/{}/status/".format(v.pk))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {"status": "done", "progress": sum(clear.values()), "tallied": True},
+        )
+
+    @override_settings(TALLY_BACKGROUND=True)
+    def test_tally_background(self):
+        v = self.create_voting()
+        v.start_date = timezone.now()
+        v.end_date = timezone.now()
+        v.save()
+
+        self.login()
+        data = {"action": "tally"}
+        with mock.patch("voting.jobs.get_executor") as executor:
+            response = self.client.put("/voting/{}/".format(v.pk), data, format="json")
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.json(), "Voting tally started")
+            executor().submit.assert_called_once()
+
+            response = self.client.put("/voting/{}/".format(v.pk), data, format="json")
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), "Voting is being tallied")
+
+        v.refresh_from_db()
+        self.assertEqual(v.tally_status, Voting.TallyStatus.QUEUED)
+
+    def test_start_tally(self):
+        v = self.create_voting()
+        self.assertTrue(v.start_tally())
+        self.assertTrue(v.tally_running())
+
+        # the other request reads the voting before the status changes
+        other = Voting.objects.get(pk=v.pk)
+        self.assertFalse(v.start_tally())
+        self.assertFalse(other.start_tally())
+
+        # the process running the tally died
+        stale = timezone.now() - timedelta(seconds=settings.TALLY_STALE_TIMEOUT + 1)
+        Voting.objects.filter(pk=v.pk).update(tally_updated=stale)
+        v.refresh_from_db()
+        self.assertFalse(v.tally_running())
+        self.assertTrue(v.start_tally())
+
     def test_create_voting_from_api(self):
         data = {"name": "Example"}
         response = self.client.post("/voting/", data, format="json")
@@ -116,6 +282,7 @@ class VotingTestCase(BaseTestCase):
         response = self.client.post("/voting/", data, format="json")
         self.assertEqual(response.status_code, 201)
 
+    @override_settings(TALLY_BACKGROUND=False)
     def test_update_voting(self):
         voting = self.create_voting()
 
@@ -196,6 +363,32 @@ class VotingTestCase(BaseTestCase):
         self.assertEqual(response.status_code, 400)
         self.assertEqual(response.json(), "Voting already tallied")
 
+    def test_voting_cache(self):
+        v = self.create_voting()
+        data = voting_cache.get_voting(v.pk)
+        self.assertEqual(data["id"], v.pk)
+        self.assertEqual(data["name"], "test voting")
+        self.assertEqual(len(data["question"]["options"]), 5)
+        self.assertEqual(len(data["auths"]), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(voting_cache.get_voting(v.pk), data)
+
+        v.start_date = timezone.now()
+        v.save()
+        start_date, end_date = voting_cache.get_dates(voting_cache.get_voting(v.pk))
+        self.assertEqual(start_date, v.start_date)
+        self.assertIsNone(end_date)
+
+        QuestionOption(question=v.question, option="option 6").save()
+        data = voting_cache.get_voting(v.pk)
+        self.assertEqual(len(data["question"]["options"]), 6)
+
+        v.auths.clear()
+        self.assertEqual(voting_cache.get_voting(v.pk)["auths"], [])
+
+        v.delete()
+        self.assertIsNone(voting_cache.get_voting(v.pk))
+
     def test_to_string(self):
         # Crea un objeto votacion
         v = self.create_voting()
@@ -13,6 +13,11 @@ urlpatterns = [
     path("start/<int:voting_id>/", views.VotingList.start_voting, name="voting_start"),
     path("stop/<int:voting_id>/", views.VotingList.stop_voting, name="voting_stop"),
     path("tally/<int:voting_id>/", views.VotingTally.as_view(), name="voting_tally"),
+    path(
+        "tally/<int:voting_id>/status/",
+        views.VotingTallyStatus.as_view(),
+        name="voting_tally_status",
+    ),
     path("question/list/", views.QuestionList.as_view(), name="question_list"),
     path("question/add/", views.QuestionCreation.as_view(), name="question_creation"),
     path(
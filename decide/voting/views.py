@@ -1,4 +1,4 @@
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, JsonResponse
 from django.urls import reverse
 import django_filters.rest_framework
 from django.conf import settings
@@ -8,8 +8,9 @@ from rest_framework import generics, status
 from rest_framework.response import Response
 from django.views.generic import TemplateView
 from rest_framework.permissions import IsAdminUser
-from census.models import Census
+from census.models import add_voters
 
+from voting.jobs import submit_tally
 from voting.forms import CensusForm, QuestionForm, QuestionOptionFormSet, VotingForm
 from .models import Question, QuestionOption
 from .serializers import SimpleVotingSerializer, VotingSerializer, QuestionSerializer
@@ -196,11 +197,28 @@ class VotingTally(TemplateView):
             if voting.tally or not voting.end_date or not voting.start_date:
                 return HttpResponseRedirect(reverse("voting_list"))
             token = request.session.get("auth-token", "")
-            voting.tally_votes(token)
+            submit_tally(voting, token)
             return redirect("voting_list")
         else:
             return render(request, '403.html', status=403)
 
+
+class VotingTallyStatus(TemplateView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, voting_id, *args, **kwargs):
+        if request.user.is_staff:
+            voting = get_object_or_404(Voting, pk=voting_id)
+            return JsonResponse(
+                {
+                    "status": voting.tally_status,
+                    "progress": voting.tally_progress,
+                    "tallied": bool(voting.postproc),
+                }
+            )
+        else:
+            return render(request, '403.html', status=403)
+
 class VotingCreation(TemplateView):
     permission_classes = [IsAdminUser]
 
@@ -247,10 +265,7 @@ class CensusVoting(TemplateView):
             form = CensusForm(request.POST)
             if form.is_valid():
                 users = form.cleaned_data["user"]
-                for user in users:
-                    if not Census.objects.filter(voting_id=voting_id, voter_id=user.id).exists():
-                        census = Census(voting_id=voting_id, voter_id=user.id)
-                        census.save()
+                add_voters((voting_id, user.id) for user in users)
                 return redirect("voting_list")
             return render(request, "census_voting.html", {"form": form})
         else:
@@ -301,8 +316,15 @@ class VotingUpdate(generics.RetrieveUpdateDestroyAPIView):
                 msg = "Voting already tallied"
                 st = status.HTTP_400_BAD_REQUEST
             else:
-                voting.tally_votes(request.auth.key)
-                msg = "Voting tallied"
+                done = submit_tally(voting, request.auth.key)
+                if done is None:
+                    msg = "Voting is being tallied"
+                    st = status.HTTP_400_BAD_REQUEST
+                elif done:
+                    msg = "Voting tallied"
+                else:
+                    msg = "Voting tally started"
+                    st = status.HTTP_202_ACCEPTED
         else:
             msg = "Action not found, try with start, stop or tally"
             st = status.HTTP_400_BAD_REQUEST
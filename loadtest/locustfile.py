@@ -60,6 +60,45 @@ class DefVoters(SequentialTaskSet):
         self.voter = None
 
 
+class DefFastVoters(TaskSet):
+    """
+    Voters that log in once and then keep posting votes, to measure the
+    vote ingestion of the store without the login and getuser requests
+    """
+
+    def on_start(self):
+        with open("voters.json") as f:
+            voters = json.loads(f.read())
+        username, pwd = choice(list(voters.items()))
+        token = self.client.post(
+            "/authentication/login/",
+            {
+                "username": username,
+                "password": pwd,
+            },
+        ).json()
+        self.token = token.get("token")
+        self.usr = self.client.post("/authentication/getuser/", token).json()
+        self.headers = {
+            "Authorization": "Token " + self.token,
+            "content-type": "application/json",
+        }
+
+    @task
+    def voting(self):
+        self.client.post(
+            "/store/",
+            json.dumps(
+                {
+                    "vote": {"a": "12", "b": "64"},
+                    "voter": self.usr.get("id"),
+                    "voting": VOTING,
+                }
+            ),
+            headers=self.headers,
+        )
+
+
 class Visualizer(HttpUser):
     host = HOST
     tasks = [DefVisualizer]
@@ -70,3 +109,9 @@ class Voters(HttpUser):
     host = HOST
     tasks = [DefVoters]
     wait_time = between(3, 5)
+
+
+class FastVoters(HttpUser):
+    host = HOST
+    tasks = [DefFastVoters]
+    wait_time = between(0, 1)